@@ -0,0 +1,164 @@
+"""Check the vectorized GMSL mapping helpers against the loops they replaced.
+
+Each helper in ``gmsl_mapping.py`` is run on random inputs, rounded so that many values
+are tied, and its output compared with that of the original implementation, kept here
+as a reference. The outputs must be identical. The exit status is 1 if any differ::
+
+    python input_creation/check_gmsl_mapping.py --seeds 0 1 2
+"""
+import argparse
+import sys
+
+import numpy as np
+import xarray as xr
+
+from gmsl_mapping import get_bound_wts, quantile_map_rff
+
+
+def reference_get_bound_wts(trg_vals, src_vals, dim="rcp"):
+    """``get_bound_wts`` as originally written, with masked ``idxmin`` and ``idxmax``
+    over RCPs. ``lb`` and ``ub`` are RCP labels.
+    """
+    diff = trg_vals - src_vals
+    lb = diff.where(diff >= 0, np.inf)
+    no_lb = np.isinf(lb).all(dim=dim)
+    lb = lb.idxmin(dim).where(~no_lb, src_vals.idxmin(dim).broadcast_like(no_lb))
+    ub = diff.where(diff <= 0, -np.inf)
+    no_ub = np.isinf(ub).all(dim=dim)
+    ub = ub.idxmax(dim).where(~no_ub, src_vals.idxmax(dim).broadcast_like(no_ub))
+
+    lb_val = src_vals.sel({dim: lb}, drop=True)
+    ub_val = src_vals.sel({dim: ub}, drop=True)
+
+    full_range = ub_val - lb_val
+    ub_wt = ((trg_vals - lb_val) / full_range).where(full_range != 0, 1)
+
+    return xr.Dataset({"lb": lb, "ub": ub, "ub_wt": ub_wt})
+
+
+def reference_quantile_map_rff(trg_vals, src_vals, baseline_rcp, wt_ds, dim="runid"):
+    """``quantile_map_rff`` as originally written, looping over draws with an
+    ``idxmin`` over simulations for each bounding RCP. ``wt_ds.lb`` and ``wt_ds.ub``
+    are RCP labels.
+    """
+    lb_vals = []
+    ub_vals = []
+    for this_sp in trg_vals[dim]:
+        this_trg_vals = trg_vals.sel({dim: this_sp})
+        for lst, da in [(lb_vals, wt_ds.lb), (ub_vals, wt_ds.ub)]:
+            this_src_vals = src_vals.sel(rcp=da.sel({dim: this_sp}), drop=True)
+            this_baseline_rcp = baseline_rcp.sel(rcp=da.sel({dim: this_sp}), drop=True)
+            this_sim = np.abs(this_trg_vals - this_src_vals).idxmin("simulation")
+            lst.append(this_baseline_rcp.sel(simulation=this_sim))
+
+    lb_vals = xr.concat(lb_vals, dim=dim)
+    ub_vals = xr.concat(ub_vals, dim=dim)
+
+    return wt_ds.ub_wt * ub_vals + (1 - wt_ds.ub_wt) * lb_vals
+
+
+def random_inputs(seed, n_rcps=4, n_sims=100, n_draws=200, n_years=3):
+    """SESL GMSL of draws to map and of RCP simulations, AR6 baselines of the
+    simulations, and the simulation whose FaIR parameters each draw uses. GMSL values
+    are rounded to one decimal, so that many are tied.
+    """
+    rng = np.random.default_rng(seed)
+    rcps = [f"rcp{i}" for i in range(n_rcps)]
+    years = np.arange(2020, 2020 + 10 * n_years, 10)
+    # simulation labels out of order, so that positions and labels differ
+    simulations = rng.permutation(n_sims)
+
+    src_vals = xr.DataArray(
+        np.round(
+            rng.normal(np.arange(n_rcps)[:, None, None], 1, (n_rcps, n_years, n_sims)),
+            1,
+        ),
+        dims=["rcp", "year", "simulation"],
+        coords={"rcp": rcps, "year": years, "simulation": simulations},
+    )
+    trg_vals = xr.DataArray(
+        np.round(rng.normal(n_rcps / 2, n_rcps, (n_years, n_draws)), 1),
+        dims=["year", "runid"],
+        coords={"year": years, "runid": np.arange(1, n_draws + 1)},
+    )
+    baseline_rcp = xr.DataArray(
+        rng.normal(size=(n_rcps, n_years, n_sims)),
+        dims=["rcp", "year", "simulation"],
+        coords=src_vals.coords,
+    )
+    draw_sims = xr.DataArray(
+        rng.choice(simulations, n_draws),
+        dims=["runid"],
+        coords={"runid": trg_vals.runid},
+    )
+    return trg_vals, src_vals, baseline_rcp, draw_sims
+
+
+def _same(a, b):
+    equal_nan = a.dtype.kind == "f" and b.dtype.kind == "f"
+    return a.dims == b.dims and np.array_equal(a.values, b.values, equal_nan=equal_nan)
+
+
+def check_get_bound_wts(seed):
+    """Whether ``get_bound_wts`` finds the same bounding RCPs and weights as the
+    original implementation on random inputs, including missing targets.
+    """
+    trg_vals, src_vals, _, draw_sims = random_inputs(seed)
+    trg_vals = trg_vals.where(trg_vals.runid % 17 != 0)
+    src_vals = src_vals.sel(simulation=draw_sims, drop=True)
+
+    wt_ds = get_bound_wts(trg_vals, src_vals)
+    reference = reference_get_bound_wts(trg_vals, src_vals)
+    dims = reference.ub_wt.dims
+    same_bounds = all(
+        _same(
+            src_vals.rcp[wt_ds[bound]].drop_vars("rcp").transpose(*dims).astype(str),
+            reference[bound].astype(str),
+        )
+        for bound in ["lb", "ub"]
+    )
+    return same_bounds and _same(wt_ds.ub_wt.transpose(*dims), reference.ub_wt)
+
+
+def check_quantile_map_rff(seed):
+    """Whether ``quantile_map_rff`` reproduces the original loop on random inputs."""
+    trg_vals, src_vals, baseline_rcp, draw_sims = random_inputs(seed)
+    # bounding RCPs of each draw, from the RCP runs with the same FaIR parameters
+    wt_ds = get_bound_wts(trg_vals, src_vals.sel(simulation=draw_sims, drop=True))
+
+    mapped = quantile_map_rff(trg_vals, src_vals, baseline_rcp, wt_ds)
+    wt_labels = wt_ds.assign(
+        lb=src_vals.rcp[wt_ds.lb].drop_vars("rcp"),
+        ub=src_vals.rcp[wt_ds.ub].drop_vars("rcp"),
+    )
+    reference = reference_quantile_map_rff(trg_vals, src_vals, baseline_rcp, wt_labels)
+    return _same(mapped.transpose(*reference.dims), reference)
+
+
+CHECKS = {
+    "get_bound_wts": check_get_bound_wts,
+    "quantile_map_rff": check_quantile_map_rff,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare GMSL mapping helpers with their original implementations."
+    )
+    parser.add_argument(
+        "--seeds",
+        nargs="+",
+        type=int,
+        default=[0, 1, 2],
+        help="seeds of the random inputs",
+    )
+    args = parser.parse_args()
+
+    failed = []
+    for name, check in CHECKS.items():
+        for seed in args.seeds:
+            ok = check(seed)
+            print(f"{name} (seed {seed}): {'identical' if ok else 'DIFFERENT'}")
+            if not ok:
+                failed.append(name)
+    sys.exit(1 if failed else 0)
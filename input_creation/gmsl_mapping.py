@@ -0,0 +1,225 @@
+"""Mapping of SESL GMSL projections onto the AR6 GMSL baselines, used in
+``run-SESL-on-FAIR-GMST.ipynb``.
+"""
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+
+def flatten_runtype(da):
+    return xr.concat(
+        (
+            da.sel(pulse_year=2020, runtype="control", drop=True).expand_dims(
+                pulse_year=[0]
+            ),
+            da.sel(runtype="pulse", drop=True),
+        ),
+        dim="pulse_year",
+    )
+
+
+def unflatten_runtype(da):
+    control = da.sel(pulse_year=0, drop=True).expand_dims(pulse_year=da.pulse_year[1:])
+    pulse = da.drop_sel(pulse_year=0)
+    return xr.concat(
+        [control, pulse], dim=pd.Index(["control", "pulse"], name="runtype")
+    )
+
+
+def quantile_map_sesl_and_baseline(baseline, sesl_sl):
+    """AR6 baseline GMSL of each SESL simulation, matched by rank.
+
+    The baseline is taken at the midpoints of ``len(simulation)`` equal quantile
+    bins along ``sample``, and the i-th lowest of these is assigned to the simulation
+    with the i-th lowest SESL GMSL, ties in simulation order. Every other dimension,
+    e.g. ``rcp`` and ``year``, is mapped at once: the quantiles are computed in one
+    pass along ``sample`` and the simulations ranked with a single ``argsort``.
+
+    Parameters
+    ----------
+    baseline : :class:`xarray.DataArray`
+        AR6 baseline GMSL along ``sample``.
+    sesl_sl : :class:`xarray.DataArray`
+        SESL GMSL of the no-pulse runs along ``simulation``, with the other dimensions
+        of ``baseline``.
+
+    Returns
+    -------
+    :class:`xarray.DataArray`
+        Baseline GMSL along ``simulation``, sorted by simulation.
+    """
+    # get quantiles that we want to match between ar6 baselines and SESL projections
+    n_samples = sesl_sl.sizes["simulation"]
+    quantile_bounds = np.linspace(0, 1, n_samples + 1)
+    quantiles = (quantile_bounds[:-1] + quantile_bounds[1:]) / 2
+    this_baseline = baseline.quantile(q=quantiles, dim="sample").rename(
+        quantile="simulation"
+    )
+    other = [d for d in this_baseline.dims if d != "simulation"]
+    this_baseline = this_baseline.transpose(*other, "simulation")
+
+    # get ordering of SESL predictions for no-pulse scenario, and give the simulation
+    # of each rank the baseline quantile of the same rank
+    sl = sesl_sl.broadcast_like(this_baseline.isel(simulation=0, drop=True))
+    sl = sl.transpose(*other, "simulation")
+    order = np.argsort(sl.values, axis=-1, kind="stable")
+    mapped = np.empty_like(this_baseline.values)
+    np.put_along_axis(mapped, order, this_baseline.values, axis=-1)
+
+    this_baseline = this_baseline.copy(data=mapped)
+    this_baseline["simulation"] = sesl_sl.simulation.values
+    return this_baseline.transpose("simulation", *other).sortby("simulation")
+
+
+def get_bound_wts(trg_vals, src_vals, dim="rcp", year=None):
+    """Bounding RCPs of each value of ``trg_vals``, and the weight of the upper one.
+
+    The lower (upper) bound is the RCP with the largest (smallest) value of ``src_vals``
+    no greater (no less) than the target, the first one if several are tied. If no RCP
+    bounds the target, both are the closest RCP.
+
+    Parameters
+    ----------
+    trg_vals : :class:`xarray.DataArray`
+    src_vals : :class:`xarray.DataArray`
+        Values of each RCP along ``dim``, and otherwise broadcastable against
+        ``trg_vals``.
+    dim : str, optional
+
+    Returns
+    -------
+    :class:`xarray.Dataset`
+        ``lb`` and ``ub``, the integer indices along ``dim`` of ``src_vals`` of the lower
+        and upper bounding RCPs, and ``ub_wt``, the linear interpolation weight of the
+        upper one.
+    """
+    trg_vals, src_vals = xr.broadcast(trg_vals, src_vals, exclude=[dim])
+    trg = trg_vals.values[..., None]
+    src = src_vals.transpose(*trg_vals.dims, dim).values
+    n_rcps = src.shape[-1]
+
+    # sort the RCPs of each simulation and year, ties in RCP order
+    order = np.argsort(src, axis=-1, kind="stable")
+    src_sorted = np.take_along_axis(src, order, axis=-1)
+
+    def first_rcp(sorted_pos):
+        # lowest RCP index of those tied with the value at sorted_pos
+        val = np.take_along_axis(src_sorted, sorted_pos, axis=-1)
+        return np.take_along_axis(order, (src_sorted < val).sum(-1, keepdims=True), axis=-1)
+
+    # number of RCPs below the target, and no greater than it
+    n_below = (src_sorted < trg).sum(-1, keepdims=True)
+    n_le = (src_sorted <= trg).sum(-1, keepdims=True)
+    no_lb = n_le == 0
+    no_ub = (n_below == n_rcps) | np.isnan(trg)
+
+    lb = np.where(no_lb, order[..., :1], first_rcp(np.maximum(n_le - 1, 0)))
+    ub = np.where(
+        no_ub,
+        first_rcp(np.full_like(n_below, n_rcps - 1)),
+        first_rcp(np.minimum(n_below, n_rcps - 1)),
+    )
+
+    lb_val = np.take_along_axis(src, lb, axis=-1)
+    ub_val = np.take_along_axis(src, ub, axis=-1)
+    full_range = ub_val - lb_val
+    ub_wt = np.where(
+        full_range != 0, (trg - lb_val) / np.where(full_range != 0, full_range, 1), 1
+    )
+
+    def to_da(arr):
+        return xr.DataArray(arr[..., 0], dims=trg_vals.dims, coords=trg_vals.coords)
+
+    return xr.Dataset({"lb": to_da(lb), "ub": to_da(ub), "ub_wt": to_da(ub_wt)})
+
+
+def _nearest_simulation(src_sorted, order, trg, rcp_idx):
+    """Index of the simulation nearest to each target value, among the simulations of
+    its RCP.
+
+    ``src_sorted`` holds the (row, rcp, simulation) source values sorted along
+    simulations, and ``order`` the original simulation index of each of them. ``trg``
+    and ``rcp_idx`` hold the (row, target) target values and the index of the RCP each
+    is compared against. Ties are broken in favour of the first simulation, as with
+    ``idxmin``.
+    """
+    n_sims = src_sorted.shape[-1]
+    out = np.zeros(trg.shape, dtype=np.intp)
+    for row in range(trg.shape[0]):
+        for rcp in np.unique(rcp_idx[row]):
+            mask = rcp_idx[row] == rcp
+            vals = src_sorted[row, rcp]
+            x = trg[row, mask]
+
+            # the nearest value is one of the two values bracketing the target
+            pos = np.searchsorted(vals, x)
+            right = np.minimum(pos, n_sims - 1)
+            # first of a run of equal values is the lowest simulation index
+            left = np.searchsorted(vals, vals[np.maximum(pos - 1, 0)])
+            d_left = np.abs(x - vals[left])
+            d_right = np.abs(x - vals[right])
+            sims = order[row, rcp]
+            take_right = (d_right < d_left) | (
+                (d_right == d_left) & (sims[right] < sims[left])
+            )
+            out[row, mask] = sims[np.where(take_right, right, left)]
+    return out
+
+
+def quantile_map_rff(trg_vals, src_vals, baseline_rcp, wt_ds, dim="runid"):
+    """Baseline GMSL of each draw in ``trg_vals``, as the weighted average of the
+    baselines of its bounding RCPs.
+
+    Within each bounding RCP, the draw takes the baseline of the simulation whose SESL
+    GMSL in ``src_vals`` is nearest to its own. Simulation values are sorted once per
+    RCP and year, and the nearest one found for every draw at once.
+
+    Parameters
+    ----------
+    trg_vals : :class:`xarray.DataArray`
+        SESL GMSL of the draws to map, along ``dim``.
+    src_vals, baseline_rcp : :class:`xarray.DataArray`
+        SESL GMSL and AR6 baseline GMSL of each ``rcp`` and ``simulation``.
+    wt_ds : :class:`xarray.Dataset`
+        Output of :func:`get_bound_wts` for ``trg_vals``, against the RCPs of
+        ``src_vals``, in the same order.
+    dim : str, optional
+        Dimension of the draws in ``trg_vals``.
+
+    Returns
+    -------
+    :class:`xarray.DataArray`
+    """
+    other = [d for d in src_vals.dims if d not in ("rcp", "simulation")]
+    rest = [d for d in wt_ds.ub_wt.dims if d not in other]
+    baseline_rcp = baseline_rcp.sel(rcp=src_vals.rcp, simulation=src_vals.simulation)
+
+    def rows(da, *dims):
+        arr = da.transpose(*other, *dims).values
+        return arr.reshape((-1,) + arr.shape[len(other) :])
+
+    src = rows(src_vals, "rcp", "simulation")
+    baseline = rows(baseline_rcp, "rcp", "simulation")
+    trg = rows(trg_vals.broadcast_like(wt_ds.ub_wt), *rest).reshape(len(src), -1)
+
+    # sort the simulations of each RCP once per year
+    order = np.argsort(src, axis=-1, kind="stable")
+    src_sorted = np.take_along_axis(src, order, axis=-1)
+
+    row_idx = np.arange(len(src))[:, None]
+    bound_vals = []
+    for bound in [wt_ds.lb, wt_ds.ub]:
+        rcp_idx = rows(bound, *rest).reshape(trg.shape)
+        sim_idx = _nearest_simulation(src_sorted, order, trg, rcp_idx)
+        bound_vals.append(
+            xr.DataArray(
+                baseline[row_idx, rcp_idx, sim_idx].reshape(
+                    [wt_ds.ub_wt.sizes[d] for d in other + rest]
+                ),
+                dims=other + rest,
+                coords={k: v for k, v in wt_ds.ub_wt.coords.items()},
+            )
+        )
+    lb_vals, ub_vals = bound_vals
+
+    return wt_ds.ub_wt * ub_vals + (1 - wt_ds.ub_wt) * lb_vals
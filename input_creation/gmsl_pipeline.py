@@ -0,0 +1,525 @@
+"""Headless RFF GMSL emulation pipeline.
+
+Runs the workflow of ``run-SESL-on-FAIR-GMST.ipynb`` from the command line, as a
+sequence of stages:
+
+- ``rcp``: SESL projections of the SSP-RCP FaIR runs, quantile-mapped onto the AR6
+  GMSL baselines
+- ``fair``: RFF FaIR GMST trajectories
+- ``sesl``: SESL projections of the RFF FaIR runs
+- ``weights``: bounding RCPs of each RFF draw and their weights
+- ``baselines``: AR6 baselines of each RFF draw, quantile-mapped from the RCPs
+- ``deltas``: GMSL of the control and pulse runs, as the baseline plus the SESL pulse
+  delta
+- ``write``: the final, attributed ``gmsl`` dataset
+
+Each stage writes its result to a Zarr store under the work directory, chunk by chunk
+as dask computes it, and later stages read it back lazily, so workers only ever hold a
+few chunks in memory. Completed stages are recorded in ``pipeline.json`` in the work
+directory, and a rerun with the same settings resumes after the last completed stage::
+
+    python gmsl_pipeline.py --inputs coastal_gmsl_inputs --work-dir gmsl_checkpoints
+
+The notebook requires xarray 2022.3.0 for ``map_blocks`` to work properly, and so does
+this pipeline. Converting the AR6 baselines to cm also requires ``pint-xarray``, which
+is not in the ``dscim-epa`` environment.
+"""
+import argparse
+import json
+import shutil
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from gmsl_mapping import (
+    flatten_runtype,
+    get_bound_wts,
+    quantile_map_rff,
+    quantile_map_sesl_and_baseline,
+    unflatten_runtype,
+)
+from sesl import (
+    bias_correct_temps,
+    get_ics,
+    load_dangendorf,
+    load_param_file,
+    project_sesl,
+    resample_ics,
+)
+
+STAGES = ["rcp", "fair", "sesl", "weights", "baselines", "deltas", "write"]
+
+FAIR_RCP_VERS = "v4.0_Jan212022"
+FAIR_RFF_VERS = {
+    "CO2_Fossil": "v5.03_Feb072022",
+    "CH4": "v5.03_Feb072022",
+    "N2O": "v5.03_Feb072022",
+}
+FAIR_RFF_OUT_VERS = "v5.03_Feb072022"
+SESL_VERS = "v0.1"
+
+FAIR_RFF_STUB = (
+    "ar6_rff_fair162_control_pulse_{gas_stub}*_emis_conc_rf_temp_lambdaeff_"
+    "ohc_emissions-driven_naturalfix_{version}.nc"
+)
+
+# attrs
+DESCRIPTION = "Simulations of GMSL relative to a 1991-2009 mean, from 2020 to 2500, consistent with FAIR GMST simulations "
+DESCRIPTION_RCP = DESCRIPTION + "of the RCP scenarios"
+DESCRIPTION_RFF = DESCRIPTION + "of the RFF emissions ensemble"
+
+METHOD_RCP = 'A Semi-Empirical Sea Level (SESL) model (github.com/bobkopp/SESL) probabilistically converts a GMST time-series to a GMSL time series. This is applied to both control and pulse scenarios and the difference is taken. This "pulse delta" is then added to a baseline trajectory taken from GMSL simulations used in IPCC AR6 (provided via personal correspondance from Bob Kopp). Draws of SESL/FAIR model "pulse delta" and draws of AR6 "possibilistic" projections are aligned before summing by quantile-matching the 2300 GMSL projected under the control FAIR scenario with that of the AR6 projections. The parameter distribution used for the SESL model was provided via personal correspondance from Bob Kopp. All other SESL input data is taken from the github repo. The AR6 projections end in 2300. To project 2300-2500, we align the SESL control scenarios to the AR6 projections (using the previously defined quantile-matching pairs) and allow SLR to evolve based on the SESL control runs from 2300-2500. Finally, to convert from the AR6 reference period (1996-2014) to the reference period used in the rest of the coastal impacts work (1991-2009), we use a reconstruction of historical sea levels from Dangendorf et al. 2019 (https://www.nature.com/articles/s41558-019-0531-8#MOESM2). We take the means of these two periods and use that offset to adjust the GMSL projections. For the "median" runs, we use a temperature simulation from median FAIR parameters. For SESL, we take the median parameters from the two temperature reconstruction datasets (Marcott and Mann), calculate the resulting sea level values, and then take the mean of these two outputs.'
+
+METHOD_RFF = (
+    METHOD_RCP
+    + """
+
+Because the baseline trajectories are only available for the RCPs, we emulate a baseline for each RFF emissions ensemble member. We do this by taking the weighted average of the GMSL of the two bounding RCPs surrounding each RFF scenario. The ordering is determined by integrated radiative forcing from 2016 (the first year of deviation in the RCPs). This forcing is as output from FAIR. When the RFF draw falls outside the range of the RCPs included in the AR6 outputs, the GMSL from the closest RCP (in integrated forcing space) is chosen."""
+)
+
+HISTORY = """version 3.0: RCP runs. Initial model. Version starts at 3.0 to align with current version of FAIR GMST outputs.
+version 3.1: RCP runs. Offsetting to a 0 GMSL in 2000 baseline (previously was 2005). This is to match the 0 point of LocalizeSL and the projections.
+version 4.0: RCP runs. Correct bad AR6 baseline input due to bug bringing all scenarios to the mean in 2100 for workflow 0. Version bump occurs to keep pace with FAIR temperature version increase.
+version 4.0_Jan212022: RCP runs. Model GMSL from pulses of other GHGs. Updated FACTS distributions.
+version 5.0:  RFF runs. Same as v4.0 but for RFF outputs. First version to output both RFF and RCP-based GMSL datasets.
+version 5.0.1:  RFF runs. Uses v5.0.1 of RFF FAIR outputs (fixed FAIR bug from v5.0 related to RFF outputs only)
+version 5.02:  RFF runs. Uses v5.02 of RFF FAIR outputs. Update RFF-RCP matching algorithm to use SESL-GMSL as the index rather than radiative forcing. Also update such that if the 5 RCPs paired with the same FAIR parameters do not bound the RFF draw, search first across FAIR parameter draws and then across nearby years. See User Manual for more details.
+version 5.02_Jan72022: RFF runs. Model GMSL from multiple pulse years.
+version 5.02_Jan222022:  RFF runs. Model GMSL from pulses of other GHGs. Updated FACTS distributions
+version 5.03_Feb072022: RFF runs with RFF-FaIR climate param pairings. Model GMSL from pulses of CO2, CH4, N2O.
+"""
+
+REF_PERIOD = "1991-2009"
+
+AUTHOR = "Ian Bolliger"
+CONTACT = "ibolliger@rhg.com"
+
+
+def default_paths(inputs):
+    """Paths of the inputs under the ``coastal_gmsl_inputs`` directory ``inputs``, and
+    of the output, as set in the notebook.
+    """
+    other = Path(inputs) / "other"
+    return {
+        "sesl_params": other / "params" / "sesl" / f"{SESL_VERS}.json",
+        "sesl_raw": other,
+        "gmsl_hist": other / "dangendorf_2019_GMSL_hist.txt",
+        "ar6_baselines": other / "v1.0.zarr",
+        "fair_rff": other,
+        "fair_rcp": other
+        / (
+            "ar6_fair162_control_pulse_2020-2030-2040-2050-2060-2070-2080_emis_conc_rf_"
+            f"temp_lambdaeff_emissions-driven_naturalfix_{FAIR_RCP_VERS}.nc"
+        ),
+        "crosswalk": other / "rffsp_fair_sequence.nc",
+        "output": Path(
+            "ar6_rff_iter0-19_fair162_control_pulse_2020-2030-2040-2050-2060-2070-2080_"
+            f"gmsl_emissions-driven_naturalfix_{FAIR_RFF_OUT_VERS}.zarr"
+        ),
+    }
+
+
+def load_baselines(paths):
+    """AR6 GMSL baselines in cm, annualized and relative to a 1991-2009 datum."""
+    try:
+        import pint_xarray  # noqa: F401
+    except ImportError:
+        raise ImportError(
+            "Loading the AR6 baselines requires pint-xarray, which is not in the "
+            "dscim-epa environment. Please install it."
+        )
+
+    baselines = (
+        xr.open_zarr(paths["ar6_baselines"], chunks=None)
+        .sea_level_change.pint.quantify()
+        .pint.to("cm")
+        .pint.dequantify()
+        .sel(workflow=["wf_1f", "wf_2f"])
+        .dropna("rcp", how="all")
+        .stack(sample=["workflow", "samples"])
+        .rename(years="year")
+    )
+    baselines["sample"] = np.arange(len(baselines.sample))
+    baselines = baselines.interp(year=np.arange(baselines.year[0], baselines.year[-1] + 1))
+
+    # AR6 projections use a 1996-2014 datum, moved to 1991-2009 with the historical GMSL
+    # of Dangendorf et al. 2019
+    msl_hist = load_dangendorf(paths["gmsl_hist"])
+    msl_hist_yr = msl_hist.resample("y").mean()
+    msl_hist_yr.index = msl_hist_yr.index.year
+    msl_hist_rolling = msl_hist_yr.rolling(19, center=True).mean()
+    offset_05_to_00 = (msl_hist_rolling[2005] - msl_hist_rolling[2000]) / 10
+    return baselines + offset_05_to_00
+
+
+def _write(ds, path, **kwargs):
+    """Write ``ds`` to the Zarr store ``path``, computing its dask chunks as they are
+    written.
+    """
+    ds = ds.copy()
+    for var in ds.variables.values():
+        var.encoding = {}
+    ds.to_zarr(path, consolidated=True, **kwargs)
+
+
+class GMSLPipeline:
+    """The RFF GMSL emulation, run stage by stage with Zarr checkpoints.
+
+    Parameters
+    ----------
+    inputs : str or :class:`pathlib.Path`
+        The ``coastal_gmsl_inputs`` directory.
+    work_dir : str or :class:`pathlib.Path`
+        Directory of the stage checkpoints and of ``pipeline.json``.
+    output : str or :class:`pathlib.Path` or None, optional
+        Zarr store to write the final dataset to. Defaults to the notebook's output
+        name in the working directory.
+    runid_chunk : int, optional
+        Number of RFF-SP draws per chunk.
+    """
+
+    def __init__(self, inputs, work_dir, output=None, runid_chunk=5000):
+        self.paths = default_paths(inputs)
+        if output is not None:
+            self.paths["output"] = Path(output)
+        self.work_dir = Path(work_dir)
+        self.runid_chunk = runid_chunk
+        with open(self.paths["sesl_params"], "r") as f:
+            self.sesl_p = json.load(f)
+        self.state_path = self.work_dir / "pipeline.json"
+        self.settings = {
+            "inputs": str(Path(inputs).absolute()),
+            "runid_chunk": runid_chunk,
+        }
+
+    def checkpoint(self, stage):
+        return self.work_dir / f"{stage}.zarr"
+
+    def run(self, from_stage=None, to_stage=None):
+        """Run every stage not completed yet, or every stage from ``from_stage`` on, up
+        to ``to_stage`` included.
+        """
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        done = self._load_state()
+        if from_stage is not None:
+            done = [s for s in done if STAGES.index(s) < STAGES.index(from_stage)]
+        last = STAGES.index(to_stage) if to_stage is not None else len(STAGES) - 1
+        for stage in STAGES[: last + 1]:
+            if stage in done:
+                print(f"Stage {stage} already completed, skipping")
+                continue
+            print(f"Running stage {stage}...")
+            start = time.perf_counter()
+            if stage != "write" and self.checkpoint(stage).exists():
+                shutil.rmtree(self.checkpoint(stage))
+            getattr(self, f"stage_{stage}")()
+            done.append(stage)
+            self._save_state(done)
+            print(f"Stage {stage} completed in {time.perf_counter() - start:.0f}s")
+
+    def _load_state(self):
+        """Stages already completed with the same settings."""
+        if self.state_path.exists():
+            with open(self.state_path) as f:
+                state = json.load(f)
+            if state["settings"] == self.settings:
+                return state["done"]
+            print("Settings changed since the last run, starting over")
+        return []
+
+    def _save_state(self, done):
+        tmp = self.state_path.with_suffix(".json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"settings": self.settings, "done": done}, f, indent=1)
+        tmp.replace(self.state_path)
+
+    def load_rcp(self):
+        """SESL projections, parameters and AR6 baselines of the RCP runs, and the RCPs
+        interpolated between others.
+        """
+        path = self.checkpoint("rcp")
+        sl_rcp = xr.open_zarr(path, group="sesl").sl.load()
+        params = xr.open_zarr(path, group="params").load()
+        baseline_rcp = xr.open_zarr(path, group="baseline")
+        return sl_rcp, params, baseline_rcp.baseline.load(), baseline_rcp.attrs["interpolated"]
+
+    def stage_rcp(self):
+        paths, sesl_p = self.paths, self.sesl_p
+
+        # SESL projections of the FaIR RCP runs
+        with open(paths["fair_rcp"], "rb") as f:
+            fair_temps_rcp = flatten_runtype(
+                xr.open_dataset(f).temperature.drop_vars("scalar").load()
+            )
+        with open(paths["sesl_raw"] / "Parameters.mat", "rb") as f:
+            params = load_param_file(f)
+        ics_rcp = get_ics(len(fair_temps_rcp.simulation), params, sesl_p, paths["sesl_raw"])
+        param_sims_rcp = resample_ics(ics_rcp, fair_temps_rcp.simulation, params)
+        fair_temps_rcp = bias_correct_temps(
+            fair_temps_rcp,
+            sesl_p["T_bias_correction_period"],
+            param_sims_rcp.T_ref,
+            first_year=2000,
+        )
+        sl_rcp = project_sesl(fair_temps_rcp, param_sims_rcp)
+
+        # quantile map within each year, for all years and RCPs at once
+        baselines = load_baselines(paths).load()
+        final_year = baselines.year.max().item()
+        sl_rcp_baselines = (
+            sl_rcp.sel(pulse_year=0, year=baselines.year, rcp=baselines.rcp)
+            .drop_vars("pulse_year")
+            .load()
+        )
+        baseline_rcp = quantile_map_sesl_and_baseline(baselines, sl_rcp_baselines)
+
+        # interpolate to RCPs missing from the AR6 baselines
+        sl_rcp_to_interp = (
+            sl_rcp.sel(pulse_year=0, year=baselines.year)
+            .drop_sel(rcp=baselines.rcp)
+            .drop_vars("pulse_year")
+            .rename(rcp="tmp")
+        )
+        rcp_wt_ds = get_bound_wts(sl_rcp_to_interp, sl_rcp_baselines)
+        baseline_rcp_extra = quantile_map_rff(
+            sl_rcp_to_interp.rename(simulation="iter"),
+            sl_rcp_baselines,
+            baseline_rcp,
+            rcp_wt_ds.rename(simulation="iter"),
+            dim="iter",
+        ).rename(iter="simulation", tmp="rcp")
+        baseline_rcp = xr.concat((baseline_rcp, baseline_rcp_extra), dim="rcp").sel(
+            rcp=sl_rcp.rcp
+        )
+        interpolated = [str(rcp) for rcp in sl_rcp_to_interp.tmp.values]
+
+        # add on the post-2300 years by bias-correcting SESL projections to the AR6
+        # baselines in their final year
+        extra = sl_rcp.sel(pulse_year=0, year=slice(final_year + 1, None)).drop_vars(
+            "pulse_year"
+        )
+        comp = sl_rcp.sel(pulse_year=0, year=final_year, drop=True)
+        baseline_rcp = xr.concat(
+            (baseline_rcp, extra + baseline_rcp.isel(year=-1, drop=True) - comp),
+            dim="year",
+        )
+
+        path = self.checkpoint("rcp")
+        _write(sl_rcp.reset_coords(drop=True).to_dataset(name="sl"), path, group="sesl")
+        _write(
+            param_sims_rcp[["a", "tau", "tau_c", "T0_2000", "c_2000", "T_ref"]]
+            .reset_coords(drop=True),
+            path,
+            group="params",
+        )
+        _write(
+            baseline_rcp.reset_coords(drop=True)
+            .to_dataset(name="baseline")
+            .assign_attrs(interpolated=interpolated),
+            path,
+            group="baseline",
+        )
+
+    def stage_fair(self):
+        fair_rff = []
+        for gas_stub, version in FAIR_RFF_VERS.items():
+            this = xr.open_mfdataset(
+                sorted(
+                    self.paths["fair_rff"].glob(
+                        FAIR_RFF_STUB.format(gas_stub=gas_stub, version=version)
+                    )
+                ),
+                chunks={"runid": self.runid_chunk},
+            )[["temperature", "climate_param_index"]]
+            fair_rff.append(flatten_runtype(this.temperature))
+
+        fair_rff = xr.concat(
+            fair_rff, dim=pd.Index(list(FAIR_RFF_VERS), name="gas")
+        ).to_dataset(name="temperature")
+        fair_rff["climate_param_index"] = this.climate_param_index.isel(
+            pulse_year=0, drop=True
+        )
+        fair_rff = fair_rff.expand_dims({"iter": [1]})
+        # SESL runs over all years at once
+        _write(
+            fair_rff.chunk(
+                {"gas": 1, "pulse_year": 1, "runid": self.runid_chunk, "iter": -1, "year": -1}
+            ),
+            self.checkpoint("fair"),
+        )
+
+    def stage_sesl(self):
+        _, param_sims_rcp, _, _ = self.load_rcp()
+        fair_rff = xr.open_zarr(self.checkpoint("fair"))
+        crosswalk = xr.open_dataset(self.paths["crosswalk"])
+
+        # use the same pairings of FaIR and SESL params as for the RCPs
+        param_sims_rff = (
+            param_sims_rcp.sel(simulation=crosswalk.simulation)
+            .reset_coords(drop=True)
+            .expand_dims({"iter": [1]})
+        )
+        fair_temps_rff = bias_correct_temps(
+            fair_rff.temperature,
+            self.sesl_p["T_bias_correction_period"],
+            param_sims_rff.T_ref,
+            first_year=2000,
+        )
+        sl_rff = fair_temps_rff.map_blocks(
+            project_sesl,
+            (param_sims_rff.chunk({"runid": self.runid_chunk}),),
+            template=fair_temps_rff,
+        )
+        _write(sl_rff.to_dataset(name="sl"), self.checkpoint("sesl"))
+
+    def _wt_vals(self):
+        """SESL GMSL of the RFF draws and of the RCPs with AR6 baselines, in the years
+        of the baselines, as used to find the bounding RCPs of each draw.
+        """
+        sl_rcp, _, baseline_rcp, interpolated = self.load_rcp()
+        sl_rff = xr.open_zarr(self.checkpoint("sesl")).sl
+        rff_wt_vals = (
+            sl_rff.sel(year=baseline_rcp.year, pulse_year=0, gas="CO2_Fossil")
+            .drop_vars(["pulse_year", "gas"])
+            .chunk({"runid": self.runid_chunk, "iter": -1, "year": 10})
+        )
+        rcp_wt_vals = (
+            sl_rcp.sel(year=baseline_rcp.year, pulse_year=0)
+            .drop_sel(rcp=interpolated)
+            .drop_vars("pulse_year")
+        )
+        return rff_wt_vals, rcp_wt_vals, baseline_rcp.drop_sel(rcp=interpolated)
+
+    def stage_weights(self):
+        rff_wt_vals, rcp_wt_vals, _ = self._wt_vals()
+        fair_params_rff = xr.open_zarr(self.checkpoint("fair")).climate_param_index.load()
+        rcp_wt_vals_reshaped = rcp_wt_vals.sel(
+            simulation=fair_params_rff, drop=True
+        ).chunk(rff_wt_vals.chunksizes)
+        wt_ds = rff_wt_vals.map_blocks(
+            get_bound_wts,
+            (rcp_wt_vals_reshaped,),
+            template=xr.Dataset(
+                {
+                    "lb": rff_wt_vals.astype(int),
+                    "ub": rff_wt_vals.astype(int),
+                    "ub_wt": rff_wt_vals,
+                }
+            ),
+        )
+        _write(wt_ds.reset_coords(drop=True), self.checkpoint("weights"))
+
+    def stage_baselines(self):
+        rff_wt_vals, rcp_wt_vals, baseline_rcp = self._wt_vals()
+        wt_ds = xr.open_zarr(self.checkpoint("weights"))
+        baseline_rff = rff_wt_vals.map_blocks(
+            quantile_map_rff,
+            (
+                rcp_wt_vals.chunk({"year": 10}),
+                baseline_rcp.chunk({"year": 10}),
+                wt_ds,
+            ),
+            template=rff_wt_vals,
+        )
+        _write(
+            baseline_rff.reset_coords(drop=True).to_dataset(name="baseline"),
+            self.checkpoint("baselines"),
+        )
+
+    def stage_deltas(self):
+        baseline_rff = xr.open_zarr(self.checkpoint("baselines")).baseline
+        sl_rff = xr.open_zarr(self.checkpoint("sesl")).sl.sel(year=baseline_rff.year)
+        baseline_rff = baseline_rff.chunk({"runid": self.runid_chunk, "year": -1})
+
+        # add delta from SESL to baseline
+        out_rff_diag = xr.concat(
+            (
+                baseline_rff.expand_dims(pulse_year=[0]),
+                baseline_rff
+                + sl_rff.drop_sel(pulse_year=0)
+                - sl_rff.sel(pulse_year=0, drop=True),
+            ),
+            dim="pulse_year",
+        )
+        _write(
+            out_rff_diag.transpose(*sl_rff.dims)
+            .chunk({"gas": 1, "pulse_year": 1, "runid": self.runid_chunk})
+            .to_dataset(name="gmsl"),
+            self.checkpoint("deltas"),
+        )
+
+    def stage_write(self):
+        out_rff_diag = xr.open_zarr(self.checkpoint("deltas")).gmsl
+        out_rff = unflatten_runtype(out_rff_diag.sel(year=slice(None, 2300)))
+        out_rff = (
+            out_rff.chunk({"runtype": 1, "gas": 1, "pulse_year": 1})
+            .to_dataset(name="gmsl")
+            .rename({"iter": "simulation"})
+        )
+
+        out_rff.attrs.update(
+            {
+                "units": "cm",
+                "updated": pd.Timestamp.now(tz="US/Pacific").strftime("%c"),
+                "reference_period": REF_PERIOD,
+                "history": HISTORY,
+                "author": AUTHOR,
+                "contact": CONTACT,
+                "description": DESCRIPTION_RFF,
+                "method": METHOD_RFF,
+                "version": FAIR_RFF_OUT_VERS,
+            }
+        )
+        out_rff.gmsl.attrs.update(
+            {
+                "description": "Simulations of 19-year centered mean of Global Mean Sea Level anomaly under SSP scenarios",
+                "units": "cm",
+                "reference_period": REF_PERIOD,
+                "long_name": "GMSL sims rel. " + REF_PERIOD,
+            }
+        )
+        out_rff.pulse_year.attrs.update({"description": "Year of GHG pulse"})
+        _write(out_rff, self.paths["output"], mode="w")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Emulate GMSL of the RFF FaIR runs with SESL.")
+    parser.add_argument("--inputs", default="coastal_gmsl_inputs", help="the unzipped coastal_gmsl_inputs directory")
+    parser.add_argument("--work-dir", default="gmsl_checkpoints", help="directory of the stage checkpoints")
+    parser.add_argument("--output", default=None, help="Zarr store to write GMSL to, by default named as in the notebook")
+    parser.add_argument("--from-stage", choices=STAGES, default=None, help="rerun this and later stages even if completed")
+    parser.add_argument("--to-stage", choices=STAGES, default=None, help="stop after this stage")
+    parser.add_argument("--runid-chunk", type=int, default=5000, help="RFF-SP draws per chunk")
+    parser.add_argument("--scheduler", default=None, help="address of a running dask scheduler; by default a LocalCluster is started")
+    parser.add_argument("--n-workers", type=int, default=None, help="workers of the LocalCluster")
+    parser.add_argument("--memory-limit", default="auto", help="memory limit of each LocalCluster worker, e.g. 8GiB")
+    args = parser.parse_args()
+
+    if xr.__version__ != "2022.3.0":
+        warnings.warn(f"xarray {xr.__version__} is installed, but the pipeline was written for xarray 2022.3.0, which map_blocks needs to work properly")
+
+    from dask.distributed import Client, LocalCluster
+
+    if args.scheduler is None:
+        cluster = LocalCluster(n_workers=args.n_workers, memory_limit=args.memory_limit)
+        client = Client(cluster)
+    else:
+        cluster = None
+        client = Client(args.scheduler)
+    print(f"Dask dashboard: {client.dashboard_link}")
+    # workers run functions defined in these modules
+    for module in ["sesl.py", "gmsl_mapping.py"]:
+        client.upload_file(str(Path(__file__).parent / module))
+
+    try:
+        GMSLPipeline(
+            args.inputs, args.work_dir, output=args.output, runid_chunk=args.runid_chunk
+        ).run(from_stage=args.from_stage, to_stage=args.to_stage)
+    finally:
+        client.close()
+        if cluster is not None:
+            cluster.close()
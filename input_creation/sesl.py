@@ -0,0 +1,756 @@
+"""Semi-Empirical Sea Level (SESL) model used to project GMSL from FaIR GMST
+trajectories in ``run-SESL-on-FAIR-GMST.ipynb``.
+
+The year-by-year SESL recurrence in :func:`project_sesl` runs as a compiled kernel over
+contiguous per-simulation time series when numba is installed, and as a NumPy loop over
+years, vectorized across simulations, otherwise.
+"""
+from math import ceil, floor
+from pathlib import Path
+from typing import Sequence, Union
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+from scipy.io import loadmat
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def _ar1_draws(rng, mean, err, years, timescale, size):
+    """Draws of a Gaussian time series with mean ``mean``, standard deviation ``err``
+    and correlation ``exp(-abs(t2-t1)/timescale)`` between years ``t1`` and ``t2``.
+
+    Rather than factorizing the dense covariance matrix, the standardized series is
+    generated by the equivalent AR(1) recursion over (ascending) years, in time and
+    memory linear in the number of years. Returns an array of shape
+    ``(len(years),) + size``.
+    """
+    assert (np.diff(years) >= 0).all()
+    phi = np.exp(-np.diff(years) / timescale)
+    innov_sd = np.sqrt(1 - phi**2)
+
+    sims = rng.standard_normal((len(years),) + tuple(size))
+    for i in range(1, len(years)):
+        sims[i] *= innov_sd[i - 1]
+        sims[i] += phi[i - 1] * sims[i - 1]
+    sims *= np.expand_dims(err, tuple(range(1, sims.ndim)))
+    sims += np.expand_dims(mean, tuple(range(1, sims.ndim)))
+    return sims
+
+
+def calc_temp(
+    data: xr.Dataset,
+    T_err: Union[str, None],
+    T_num: int,
+    n_samples: int,
+    tau_ar1: float = 10,
+    random_state: Union[int, None] = 0,
+) -> xr.DataArray:
+    """Simulate draws of historical temperature time series based on AR1 processes.
+
+    Parameters
+    ----------
+    data : :class:`xarray.Dataset`
+        Output of ``load_data_SESL`` function. Contains mean estimate and standard
+        deviation for each year.
+    T_err : str or None,
+        Approach to simulating the time series using the standard deviation. Currently,
+        only ``ar1ts`` is supported:
+            - ``ar1ts``: AR(1) Parameter timescale == exp(-abs(t2-t1)/timescale)
+            - ``ar1``: T as AR(1) process with sigma as "default"
+            - ``default``: T + random noise as in KE11
+            - ``no``: Don't add uncertainty
+    T_num : int
+        Number of simulated time series to create
+    n_samples : int
+        Number of draws of the parameter posteriors
+    tau_ar1 : float, optional
+        If ``T_err==ar1ts``, this is the ``timescale`` parameter. Otherwise, ignored.
+    random_state : int, optional
+        If set, controls the random state for the :function:`numpy.random.default_rng`
+        function used to generate time series draws. If None, will result in
+        non-deterministic outputs
+
+    Returns
+    -------
+    :class:`xarray.DataArray`
+        Contains ``T_num`` sims of historical annual mean GMST values.
+    """
+    rng = np.random.default_rng(random_state)
+    if T_err == "ar1ts":
+        T = data.T
+        sims = _ar1_draws(
+            rng,
+            T.sel(kind="val").values,
+            T.sel(kind="err").values,
+            T.T_year.values,
+            tau_ar1,
+            (n_samples, T_num),
+        )
+        return xr.DataArray(
+            sims,
+            coords={
+                "T_sim_id": np.arange(T_num),
+                "year": T.T_year.values,
+                "sample": np.arange(n_samples),
+            },
+            dims=["year", "sample", "T_sim_id"],
+        )
+    elif T_err == "no":
+        return data.T.sel(kind="val").rename(T_year="year")
+    raise NotImplementedError
+
+
+def _decay_filter(x, g_burnin, g, n_burnin):
+    """``y[..., i] = sum(g_j ** (i - j) * x[..., j] for j <= i)`` along the last axis,
+    where ``g_j`` is ``g_burnin`` for the first ``n_burnin`` years and ``g`` after.
+
+    Computed as two first-order recursions over years, one for the contributions of
+    burn-in years and one for the rest, so no year x year matrix is formed.
+    """
+    x = np.moveaxis(x, -1, 0)
+    out = np.empty(x.shape, dtype=np.result_type(x, g_burnin, g))
+    y_burnin = np.zeros(out.shape[1:], dtype=out.dtype)
+    y = np.zeros(out.shape[1:], dtype=out.dtype)
+    for i in range(len(x)):
+        y_burnin *= g_burnin
+        y *= g
+        if i < n_burnin:
+            y_burnin += x[i]
+        else:
+            y += x[i]
+        out[i] = y_burnin + y
+    return np.moveaxis(out, 0, -1)
+
+
+def calc_T0(
+    T_sims: xr.Dataset,
+    historical_data: xr.Dataset,
+    params: xr.Dataset,
+    optim_T0: bool,
+    model: str,
+    T0_period_end: int = -1800,
+) -> xr.Dataset:
+    """Calculate draws of ``T0`` parameter from historical temperature draws.
+
+    Parameters
+    ----------
+    T_sims : :class:`xarray.Dataset`
+        Output of :func:`calc_temp`. Contains draws of historical temps.
+    historical_data : :class:`xarray.Dataset`
+        Output of :func:`pySESL.io.load_data_SESL`. Contains mean and SDs for temp and
+        sea level reconstructions.
+    params : :class:`xarray.Dataset`
+        Output of :func:`pySESL.io.load_params`. Contains posterior distributions of
+        trained SESL model parameters.
+    optim_T0 : bool
+        Whether to use the optimized T0(0) posterior distribution from ``params``
+    model : "CRdecay", "ConstRate", "CRovTau", "TwoTau", or "simpel"
+        Which model was used to train SESL model and generate ``params``.
+    T0_period_end : int, optional
+        Ending year of period used to calculate an initial T0(0). Default -1800.
+
+    Returns
+    -------
+    :class:`xarray.Dataset`
+        Contains the T0 parameter for each year and for each of the sims of historical
+        GMST contained in ``T_sims``
+    """
+    if optim_T0:
+        T0_rnd = params.T01
+    else:
+        T0_rnd = 0
+    tau1 = params.tau
+    # tau2 = params.tau_c
+
+    # if use_Mar_T0 was used
+    if "T0burnin" in historical_data.data_vars:
+        n_burnin = historical_data.T0burnin.item()
+        yrs1 = historical_data.T_year[1].item() - historical_data.T_year[0].item()
+        yrs2 = historical_data.T_year[-1].item() - historical_data.T_year[-2].item()
+        tau1_1 = tau1 / yrs1
+        tau1_2 = tau1 / yrs2
+
+        temp_1_T0 = T_sims.isel(year=slice(None, n_burnin)) / tau1_1
+        temp_1_T = T_sims.isel(year=slice(n_burnin, None)) / tau1_2
+        temp_1 = xr.concat((temp_1_T0, temp_1_T), dim="year")
+        temp_1[{"year": 0}] = (
+            T_sims.isel(year=(historical_data.T_year <= T0_period_end).values).mean(
+                "year"
+            )
+            + T0_rnd
+        )
+    else:
+        raise NotImplementedError
+
+    if model == "TwoTau":
+        raise NotImplementedError
+
+    # T0 relaxes towards temperature with timescale tau. A year's contribution decays
+    # at the rate of the time step of the reconstruction it comes from.
+    T01 = xr.apply_ufunc(
+        _decay_filter,
+        temp_1,
+        1 - 1 / tau1_1,
+        1 - 1 / tau1_2,
+        kwargs={"n_burnin": n_burnin},
+        input_core_dims=[["year"], [], []],
+        output_core_dims=[["year"]],
+    )
+    return T01.transpose(*tau1.dims, "year", ...)
+
+
+def calc_sl(
+    T_sims: xr.DataArray,
+    T0_sims: xr.DataArray,
+    params: xr.Dataset,
+    model: str,
+    period: Sequence,
+    interp_method: str = "nearest",
+) -> tuple:
+    """Calculate draws of sea level and ``c`` parameter using historical temperature
+    draws.
+
+    Parameters
+    ----------
+    T_sims : :class:`xarray.Dataset`
+        Output of :func:`calc_temp`. Contains draws of historical temps.
+    T0_sims : :class:`xarray.Dataset`
+        Output of :func:`calc_T0`. Contains T0 associated with historical T draws.
+    params : :class:`xarray.Dataset`
+        Output of :func:`pySESL.io.load_params`. Contains posterior distributions of
+        trained SESL model parameters.
+    model : "CRdecay", "ConstRate", "CRovTau", "TwoTau", or "simpel"
+        Which model was used to train SESL model and generate ``params``.
+    period : length-2 array-like
+        Period of data to include in results
+    interp_method : str, optional
+        Interpolation method used to annualize ``T_sims`` and ``T0_sims`` variables.
+
+    Returns
+    -------
+    sea : :class:`xarray.DataArray`
+        Sea Level by year for each parameter sample X temperature reconstruction sample
+    dsea : :class:`xarray.DataArray`
+        Annual change in sea Level by year for each parameter sample X temperature
+        reconstruction sample
+    c : :class:`xarray.DataArray`
+        Value of ``c`` parameter by year for each parameter sample
+    T_sims, T0_sims : :class:`xarray.DataArray`
+        Same as the input ``T_sims`` and ``T0_sims`` but interpolated to annual values
+        using ``interp_method`` and clipped to range bounded by ``period`` and
+        ``calibperiod``
+    """
+
+    if model != "CRdecay":
+        raise NotImplementedError
+
+    T_sims, T0_sims = resize_T(period, T_sims, T0_sims, interp_method=interp_method)
+    g = 1 - 1 / params.tau_c
+    G = g ** xr.DataArray(
+        np.arange(T_sims.year.size), coords={"year": T_sims.year}, dims=["year"]
+    )
+    c = params.c * G
+    dsea = c + params.a * (T_sims - T0_sims)
+    sea = dsea.cumsum("year")
+
+    return sea, dsea, c, T_sims, T0_sims
+
+
+def resample_ics(ics, sim_ids, sesl_trained_params):
+    """Resample ICs such that they have the same number of samples as are in the
+    temperature projections ``temps``.
+
+    TODO: finish docstring
+    """
+    # get T0_2000, T_ref in index of FAIR samples
+    def resample_full(ds):
+        return ds.stack(simulation=["T_sim_id", "sample", "T_data"]).isel(
+            simulation=slice(None, len(sim_ids))
+        )
+
+    T0_2000, T_ref = list(map(resample_full, [ics.T0_2000, ics.T_ref]))
+    assert (T0_2000.simulation == T_ref.simulation).all()
+
+    # get the appropriate parameters for each of the 3k sims
+    def resample_partial(ds):
+        out = ds.stack(simulation=["sample", "T_data"]).sel(
+            simulation=pd.MultiIndex.from_arrays(
+                (T0_2000.sample.values, T0_2000.T_data.values),
+                names=["sample", "T_data"],
+            )
+        )
+        if type(out) == xr.core.dataset.Dataset:
+            arrays = []
+            for i in list(out.keys()):
+                t1 = out[i]
+                t1["simulation"] = sim_ids
+                arrays = arrays + [t1.copy()]
+            out = xr.merge(arrays)
+        else:
+            out["simulation"] = sim_ids
+        return out
+
+    param_sims, c_2000 = list(map(resample_partial, [sesl_trained_params, ics.c_2000]))
+    T0_2000["simulation"] = sim_ids
+    T_ref["simulation"] = sim_ids
+    out_params = xr.merge((T0_2000, c_2000, T_ref, param_sims))
+    return out_params
+
+def get_ics(n_fair_sims, sesl_trained_params, sesl_hyperparams, sesl_input_dir):
+    """Get initial conditions T0_2000 and c_2000 necessary for projecting using SESL.
+    Also return T_ref, or the mean temperature over the reference period as defined in
+    ``sesl_hyperparams``.
+
+    TODO: finish docstring
+    """
+    # figure out how many historical temp draws to use
+    n_sesl_samps = len(sesl_trained_params.sample)
+    n_sesl_data_samps = len(sesl_trained_params.T_data)
+
+    T_num = ceil(n_fair_sims / n_sesl_samps / n_sesl_data_samps)
+
+    T0_2000 = []
+    T_ref = []
+    c_2000 = []
+
+    T_ref_range = np.arange(
+        sesl_hyperparams["T_bias_correction_period"][0],
+        sesl_hyperparams["T_bias_correction_period"][1] + 1,
+    )
+
+    for dat in sesl_hyperparams["T_data"]:
+        historical_data = load_data_SESL(
+            sesl_input_dir / (sesl_hyperparams["SL_data"] + ".mat"),
+            sesl_input_dir / (dat + ".mat"),
+            sesl_hyperparams["use_cov"],
+            sesl_hyperparams["use_Mar_T0"],
+            Mar_fpath=sesl_input_dir / "Marcott13_RegEM-HC3_20.mat",
+            T_err_sc=sesl_hyperparams["T_err_sc"],
+            cov_tau=sesl_hyperparams["cov_tau"],
+            no_neg_cov=sesl_hyperparams["no_neg_cov"],
+            baseperiod=sesl_hyperparams["baseperiod"],
+            T0_temp_level=sesl_hyperparams["T0_temp_level"],
+            T0_period_st=sesl_hyperparams["T0_period"][0],
+        )
+
+        T_sims = calc_temp(
+            historical_data,
+            sesl_hyperparams["T_err"],
+            T_num,
+            sesl_trained_params.dims["sample"],
+            tau_ar1=sesl_hyperparams["tau_ar1"],
+        )
+
+        T_ref.append(T_sims.interp(year=T_ref_range).mean("year"))
+
+        if dat[:4] == "Mann":
+            dat_short = "Mn"
+        elif dat[:4] == "Marc":
+            dat_short = "Mar"
+        else:
+            raise NotImplementedError(dat)
+        T0_sims = calc_T0(
+            T_sims,
+            historical_data,
+            sesl_trained_params.sel(T_data=dat_short, drop=True),
+            sesl_hyperparams["optim_T0"],
+            sesl_hyperparams["model"],
+            T0_period_end=sesl_hyperparams["T0_period"][1],
+        )
+        T0_2000.append(T0_sims.interp(year=2000).drop("year"))
+
+        _, _, c, _, _ = calc_sl(
+            T_sims,
+            T0_sims,
+            sesl_trained_params.sel(T_data=dat_short, drop=True),
+            sesl_hyperparams["model"],
+            [
+                min(sesl_hyperparams["period"][0], sesl_hyperparams["calibperiod"][0]),
+                max(sesl_hyperparams["period"][1], sesl_hyperparams["calibperiod"][1]),
+            ],
+        )
+
+        c_2000.append(c.sel(year=2000, drop=True))
+
+    dim = pd.Index(sesl_hyperparams["T_data"], name="T_data")
+    T0_2000, c_2000, T_ref = list(
+        map(
+            lambda x: xr.concat(x, dim=dim),
+            [T0_2000, c_2000, T_ref],
+        )
+    )
+
+    new_T_data = T0_2000.T_data.str[:3]
+    new_T_data = new_T_data.where(new_T_data == "Mar", "Mn")
+    T0_2000["T_data"] = new_T_data
+    c_2000["T_data"] = new_T_data
+    T_ref["T_data"] = new_T_data
+
+    return xr.Dataset({"T0_2000": T0_2000, "c_2000": c_2000, "T_ref": T_ref})
+
+
+def bias_correct_temps(temps, bc_period, T_ref, first_year=None):
+    """Bias correct a temperature dataset such that it matches with the reference period
+    used to calculate the T0_2000 initial condition.
+
+    TODO: finish docstring
+    """
+    return (temps - temps.sel(year=slice(*bc_period)).mean("year") + T_ref).sel(
+        year=slice(first_year, None)
+    )
+
+
+def _sesl_recurrence(temps, a, tau, tau_c, T0, c, out):
+    """SESL recurrence over the last (year) axis of the 2D ``temps``, for each row.
+
+    ``a``, ``tau``, ``tau_c`` and the initial conditions ``T0`` and ``c`` hold one value
+    per row. Sea level is written to ``out``, which must be zero in the first year.
+    """
+    for i in range(temps.shape[0]):
+        T0_i = T0[i]
+        c_i = c[i]
+        for t in range(temps.shape[1]):
+            TminusT0 = temps[i, t] - T0_i
+
+            # update SL
+            if t > 0:
+                out[i, t] = out[i, t - 1] + a[i] * TminusT0 + c_i
+
+            # update T0
+            T0_i += 1 / tau[i] * TminusT0
+
+            # update c
+            c_i *= 1 - 1 / tau_c[i]
+
+
+def _sesl_recurrence_numpy(temps, a, tau, tau_c, T0, c, out):
+    """Same as :func:`_sesl_recurrence`, looping over years and vectorized across rows."""
+    # years first, so that each step reads and writes contiguous memory
+    temps = np.ascontiguousarray(temps.T)
+    sl = np.zeros_like(temps)
+    T0 = T0.copy()
+    c = c.copy()
+    for t in range(temps.shape[0]):
+        TminusT0 = temps[t] - T0
+        if t > 0:
+            sl[t] = sl[t - 1] + a * TminusT0 + c
+        T0 += 1 / tau * TminusT0
+        c *= 1 - 1 / tau_c
+    out[:] = sl.T
+
+
+if njit is not None:
+    _sesl_kernel = njit(cache=True, nogil=True)(_sesl_recurrence)
+else:
+    _sesl_kernel = _sesl_recurrence_numpy
+
+
+def project_sesl(temps, params):
+    """Project GMSL given input temperatures and params (including initial conditions).
+    Note that ``temps`` must already be corrected to have the same reference period as
+    ``params.T0_2000``.
+
+    Parameters
+    ----------
+    temps : :class:`xarray.DataArray`
+        GMST trajectories, with a ``year`` dimension.
+    params : :class:`xarray.Dataset`
+        Output of :func:`resample_ics`. Contains the ``a``, ``tau`` and ``tau_c`` SESL
+        parameters and the ``T0_2000`` and ``c_2000`` initial conditions, along
+        dimensions of ``temps`` other than ``year``.
+
+    Returns
+    -------
+    :class:`xarray.DataArray`
+        GMSL relative to the first year, with the same dimensions and coordinates as
+        ``temps``. Can be used as the function of ``temps.map_blocks``.
+    """
+    dims = [d for d in temps.dims if d != "year"]
+    first_year = temps.isel(year=0, drop=True)
+
+    # one row per simulation, contiguous along years
+    temp_arr = np.ascontiguousarray(temps.transpose(*dims, "year").values)
+    shape = temp_arr.shape
+    temp_arr = temp_arr.reshape(-1, shape[-1])
+    a, tau, tau_c, T0, c = (
+        np.ascontiguousarray(
+            params[v].broadcast_like(first_year).transpose(*dims).values,
+            dtype=np.float64,
+        ).reshape(-1)
+        for v in ["a", "tau", "tau_c", "T0_2000", "c_2000"]
+    )
+
+    sl = np.zeros_like(temp_arr)
+    _sesl_kernel(temp_arr, a, tau, tau_c, T0, c, sl)
+
+    return xr.DataArray(
+        sl.reshape(shape),
+        dims=dims + ["year"],
+        coords=temps.coords,
+        name=temps.name,
+    ).transpose(*temps.dims)
+
+
+def resize_T(
+    period: Sequence, *das: xr.DataArray, interp_method: str = "nearest"
+) -> Sequence:
+    """Interpolate DataArrays of values at (potentially varying) time intervals to
+    annual time series, and clip them
+
+    Parameters
+    ---------
+    period : length-2 array-like
+        Starting and ending values for desired period of output DataArrays
+    interp_method : str, optional
+        Interpolation method to use to annualize inputs. Default is "nearest".
+
+    Returns
+    -------
+    tuple
+        Tuple of DataArrays of same length as ``das``, interpolated and clipped
+    """
+
+    da = das[0]
+
+    fyr = max(da.year[0].item(), period[0])
+    lyr = period[1]
+
+    out_range = da.year.isel(year=(da.year >= fyr) & (da.year <= lyr))
+    diffs = out_range.diff("year")
+    yrs_st = diffs[0]
+    yrs_end = diffs[-1]
+    yrs_out = np.arange(
+        out_range[0] - floor((yrs_st - 1) / 2),
+        out_range[-1] + ceil((yrs_end - 1) / 2) + 1,
+    )
+
+    return list(
+        map(
+            lambda x: x.interp(
+                year=yrs_out,
+                method=interp_method,
+                kwargs={"fill_value": "extrapolate"},
+            ),
+            das,
+        )
+    )
+
+
+def load_data_SESL(
+    sl_fpath: Union[str, Path],
+    T_fpath: Union[str, Path],
+    use_cov: bool,
+    use_Mar_T0: bool,
+    Mar_fpath: Union[str, Path, None] = None,
+    T_err_sc: float = 1,
+    cov_tau: float = 100,
+    no_neg_cov: bool = True,
+    baseperiod: Sequence[int] = [1400, 1800],
+    T0_temp_level: float = 100,
+    T0_period_st: int = -2000,
+) -> xr.Dataset:
+    """Load historical temperature and sea level reconstructions
+
+    Parameters
+    ----------
+    sl_fpath : str or :class:`pathlib.Path`
+        Path to sea level reconstruction input ``.mat`` file.
+    T_fpath : str or :class:`pathlib.Path`
+        Path to temperature reconstruction input ``.mat`` file.
+    use_cov : bool
+        If True, use covariance matrix of SL reconstruction data (if existing) to
+        estimate likelihood of parameter set.
+    use_Mar_T0 : bool
+        If True, use Marcott long-running temperature reconstruction to calculate ``T0``
+        value until reconstruction at ``T_fpath`` starts.
+    Mar_fpath : str or :class:`pathlib.Path` or None, optional
+        Path to Marcott sea level reconstruction input ``.mat`` file. Only used if
+        ``use_Mar_T0`` is True.
+    T_err_sc : float, optional
+        Scaling factor for temperature error uncertainty.
+    cov_tau : float, optional
+        Time scale for covariance. If not null, take the elementwise product of the
+        covariance and a tapering function exp(-delta(t)/cov_tau). Only used if
+        ``use_cov`` is True.
+    no_neg_cov : bool, optional
+        Bound covariance matrix to be non-negative. Default True.
+    baseperiod : array-like, optional
+        Reference period used for sea level data. Data are normed to have 0 mean over
+        this period. Default [1400, 1800].
+    T0_temp_level : int, optional
+        If ``use_Mar_T0`` is True, number of years over which to harmonize the mean of
+        the Marcott T time series and time series at ``T_fpath`` in order to calculate
+        T0 from Marcott.
+    T0_period_st : int, optional
+        Starting year of period used to calculate an initial T0(0).
+
+    Returns
+    -------
+    :class:`xarray.Dataset`
+        Contains the processed estimated value and error for the temperature
+        reconstruction at ``T_fpath``, the sea level reconstruction at ``sl_fpath``, and
+        the derived T0 timeseries using ``sl_fpath`` and (optionally) the long-running
+        Marcott reconstruction
+    """
+
+    # load SL proxy data
+    sl_data = loadmat(sl_fpath, squeeze_me=True)
+    sl = sl_data["sl"]
+    proxy_sl = pd.DataFrame(
+        {
+            "val": (sl[:, 1] / 10).astype(np.float64),
+            "err": (sl[:, 2] / 10).astype(np.float64),
+        },
+        index=pd.Index(sl[:, 0].astype(np.int16), name="year"),
+    )
+    C = (sl_data["C"] / 100).astype(np.float64)
+    C += np.eye(len(C)) * np.finfo(C.dtype).eps
+
+    if use_cov:
+        if cov_tau is not None:
+            Csc = np.exp(
+                -np.abs(
+                    np.expand_dims(proxy_sl.index.values, 0)
+                    - np.expand_dims(proxy_sl.index.values, 1)
+                )
+                / cov_tau
+            )
+            C *= Csc
+        else:
+            raise NotImplementedError
+        if no_neg_cov:
+            C = np.maximum(C, 0)
+
+    # rebase proxy SL data to base period
+    proxy_sl["val"] -= proxy_sl.loc[baseperiod[0] : baseperiod[1], "val"].mean()
+
+    # convert to long format
+    proxy_sl = proxy_sl.stack()
+    proxy_sl.index = proxy_sl.index.rename("kind", level=-1)
+    proxy_sl.name = "sl"
+
+    # load T reconstruction data
+    T = loadmat(T_fpath, squeeze_me=True)["T"]
+    T = pd.DataFrame(
+        T[:, 1:3],
+        columns=["val", "err"],
+        index=pd.Index(T[:, 0], name="year").astype(np.int16),
+    )
+
+    # assert common timestep
+    dyr = np.diff(T.index)
+    assert len(np.unique(dyr)) == 1
+    dyr = dyr[0]
+
+    # scale by predefined scaling factor
+    T["err"] *= T_err_sc
+
+    # convert to long format
+    T_long = T.stack()
+    T_long.index = T_long.index.rename("kind", level=-1)
+    T_long.name = "T"
+
+    # aggregate into Dataset
+    data = xr.merge(
+        (
+            proxy_sl.to_xarray().rename(year="sl_year"),
+            T_long.to_xarray().rename(year="T_year"),
+        )
+    )
+
+    # Use Mar data for early T values if using for initializing T0
+    if use_Mar_T0:
+        T_mar = loadmat(Mar_fpath)["T"]
+        T_mar = pd.DataFrame(
+            T_mar[:, 1:],
+            columns=["val", "err"],
+            index=pd.Index(T_mar[:, 0], name="year").astype(np.int16),
+        )
+        T_mar_overlap_mean = T_mar.loc[
+            T.index.min() : T.index.min() + T0_temp_level, "val"
+        ].mean()
+        T_overlap_mean = T.loc[: T.index.min() + T0_temp_level, "val"].mean()
+        T_mar["val"] = T_mar["val"] - T_mar_overlap_mean + T_overlap_mean
+        T_mar = T_mar.loc[: T.index.min() - int((dyr - 1) / 2)]
+
+        T0_temp = pd.concat((T_mar, T))
+
+        # only care about part after beginning of burnin period
+        T0_temp = T0_temp.loc[T0_period_st:]
+        T0burnin = (T0_temp.index < T.index.min()).sum()
+
+        # convert to long format
+        T0_temp = T0_temp.stack()
+        T0_temp.index = T0_temp.index.rename("kind", level=-1)
+        T0_temp.name = "T"
+
+        data = data.drop(["T", "T_year"]).assign(
+            {"T": T0_temp.to_xarray().rename(year="T_year")}
+        )
+        data["T0burnin"] = T0burnin
+
+    C = xr.DataArray(
+        C,
+        dims=["sl_year", "sl_year_cov"],
+        coords={"sl_year": data.sl_year.values, "sl_year_cov": data.sl_year.values},
+        name="sl_C",
+    )
+    data = xr.merge((data, C))
+    return data
+
+
+def _load_params_from_struct(struct):
+    """Load SESL parameter posterior distributions from a MATLAB struct."""
+    return pd.DataFrame(
+        {
+            "a": struct["a"].item(),
+            "c": struct["c"].item(),
+            "tau": struct["tau"].item(),
+            "tau_c": struct["tau_c"].item(),
+            "T01": struct["T01"].item(),
+        },
+        index=pd.Index(np.arange(len(struct["a"].item())), name="sample"),
+    ).to_xarray()
+
+def load_param_file(fpath: str) -> xr.Dataset:
+    """Load posterior parameter distribution from a trained SESL model (run in the
+    MATLAB version of the codebase).
+    """
+    data = loadmat(fpath, squeeze_me=True)["P"]
+    mar = data["Mar"].item()
+    mn = data["Mn"].item()
+    return xr.concat(
+        [_load_params_from_struct(struct) for struct in [mar, mn]],
+        dim=pd.Index(["Mar", "Mn"], name="T_data"),
+    )
+
+
+def load_dangendorf(path):
+    """Load the historical GMSL reconstruction of Dangendorf et al. 2019, in mm relative
+    to the 19-year mean centered on 2005.
+    """
+    msl_hist = pd.read_fwf(
+        path,
+        skiprows=1,
+        usecols=[0, 1],
+        names=["year", "GMSL"],
+    )
+    dt = pd.to_datetime(msl_hist.year.astype(int), format="%Y") + pd.to_timedelta(
+        (msl_hist.year - msl_hist.year.astype(int)) * 365.25, unit="d"
+    )
+    msl_hist = pd.Series(msl_hist.GMSL.values, index=dt)
+    msl_hist.index.name = "date"
+
+    # center at 1995-2014 mean
+    msl_hist_yr = msl_hist.resample("y").mean()
+    msl_hist_yr.index = msl_hist_yr.index.year
+    msl_hist_rolling = msl_hist_yr.rolling(19, center=True).mean()
+    msl_hist -= msl_hist_rolling.loc[2005]
+
+    msl_hist.name = "gmsl_rel_2005_mm"
+    return msl_hist
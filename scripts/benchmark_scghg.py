@@ -0,0 +1,238 @@
+"""Offline benchmarks of SCGHG runs on synthetic inputs.
+
+For each ensemble size, synthetic inputs with that many RFF-SP draws are generated (see
+``synthetic_inputs.py``) and ``epa_scghg`` (one run per sector) and ``epa_scghgs`` (the
+sweep over every discount rate and pulse year) are timed end to end and per stage.
+Each size is benchmarked in a fresh process, so that inputs cached and memory used by
+one size do not affect the next.
+
+Results are saved as JSON, labelled with the git commit, so that versions can be
+compared::
+
+    python scripts/benchmark_scghg.py --sizes 100 1000 10000
+    python scripts/benchmark_scghg.py --sizes 100 1000 10000 --compare benchmarks/<earlier>.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+from synthetic_inputs import DISCOUNT_TYPES, ETAS_RHOS, PULSE_YEARS, generate_inputs
+
+
+def run_benchmarks(root, sectors, pulse_years, terr_us=False, executor="serial", max_workers=None):
+    """Benchmark ``epa_scghg`` and ``epa_scghgs`` on the inputs generated under ``root``.
+
+    Runs in the current process, which must not have imported ``command_line_scghg``
+    yet, since that module reads its config on import.
+    """
+    os.chdir(root)
+    sys.argv = [sys.argv[0], "generated_conf.yml"]
+    import command_line_scghg as scghg
+    from input_cache import get_input_cache
+    from instrumentation import get_recorder
+    from sweep_executor import get_executor, worker_count
+
+    sector_names = [sector + "_USA" if terr_us else sector for sector in sectors]
+
+    def timed(benchmark, sector, fn):
+        # Each benchmark starts with an empty input cache and its own stage records
+        get_input_cache().clear()
+        get_recorder().records.clear()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            fn()
+        stages = get_recorder().totals()
+        return {
+            "benchmark": benchmark,
+            "sector": sector,
+            "wall_s": time.perf_counter() - wall,
+            "cpu_s": time.process_time() - cpu,
+            "peak_rss_mb": max((s["peak_rss_mb"] for s in stages.values()), default=None),
+            "stages": stages,
+        }
+
+    results = []
+    eta, rho = ETAS_RHOS[0]
+    menu_option, discount_type = DISCOUNT_TYPES[0]
+    for sector in sector_names:
+        results.append(
+            timed(
+                "epa_scghg",
+                sector,
+                lambda: scghg.epa_scghg(
+                    sector=sector,
+                    terr_us=terr_us,
+                    eta=eta,
+                    rho=rho,
+                    pulse_year=pulse_years[0],
+                    discount_type=discount_type,
+                    menu_option=menu_option,
+                ),
+            )
+        )
+
+    with get_executor(
+        executor,
+        max_workers=max_workers,
+        initializer=scghg.configure_input_cache,
+        initargs=(scghg.input_cache_bytes // worker_count(executor, max_workers),),
+    ) as pool:
+        for sector in sector_names:
+            results.append(
+                timed(
+                    "epa_scghgs",
+                    sector,
+                    lambda: scghg.epa_scghgs(
+                        [sector],
+                        terr_us,
+                        ETAS_RHOS,
+                        DISCOUNT_TYPES,
+                        pulse_years=pulse_years,
+                        gcnp=False,
+                        uncollapsed=False,
+                        executor=pool,
+                    ),
+                )
+            )
+    return results
+
+
+def git_commit():
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=Path(__file__).parent,
+                stderr=subprocess.DEVNULL,
+            )
+            .decode("ascii")
+            .strip()
+        )
+    except (subprocess.CalledProcessError, OSError):
+        return "unknown"
+
+
+def print_results(results, baseline=None):
+    """Print wall time, CPU time and peak RSS of each benchmark, and the speedup over
+    ``baseline`` results if given.
+    """
+    previous = {
+        (r["n_runids"], r["benchmark"], r["sector"]): r for r in (baseline or [])
+    }
+    header = f"{'runids':>8}  {'benchmark':<12}{'sector':<22}{'wall_s':>10}{'cpu_s':>10}{'peak_rss_mb':>13}"
+    if baseline is not None:
+        header += f"{'base_wall_s':>13}{'speedup':>9}"
+    print(header)
+    for r in results:
+        line = (
+            f"{r['n_runids']:>8}  {r['benchmark']:<12}{r['sector']:<22}"
+            f"{r['wall_s']:>10.2f}{r['cpu_s']:>10.2f}{r['peak_rss_mb'] or float('nan'):>13.1f}"
+        )
+        if baseline is not None:
+            base = previous.get((r["n_runids"], r["benchmark"], r["sector"]))
+            if base is None:
+                line += f"{'-':>13}{'-':>9}"
+            else:
+                line += f"{base['wall_s']:>13.2f}{base['wall_s'] / r['wall_s']:>9.2f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark SCGHG runs on synthetic inputs.")
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100, 1000, 10000], help="numbers of RFF-SP draws")
+    parser.add_argument("--sectors", nargs="+", default=["CAMEL_m1_c0.20"])
+    parser.add_argument("--pulse-years", nargs="+", type=int, default=PULSE_YEARS)
+    parser.add_argument("--terr-us", action="store_true", help="benchmark territorial U.S. runs")
+    parser.add_argument("--executor", default="serial", help="executor of the epa_scghgs sweep")
+    parser.add_argument("--executor-workers", type=int, default=None)
+    parser.add_argument("--work-dir", default=None, help="where synthetic inputs are kept; reused across benchmarks if given")
+    parser.add_argument("--output", default="benchmarks", help="directory to save results to")
+    parser.add_argument("--label", default=None, help="name of the results file, by default the date and git commit")
+    parser.add_argument("--compare", default=None, help="earlier results file to compare against")
+    parser.add_argument("--run", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--result", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run is not None:
+        # Benchmarks of one ensemble size, in a fresh process started below
+        results = run_benchmarks(
+            args.run,
+            args.sectors,
+            args.pulse_years,
+            terr_us=args.terr_us,
+            executor=args.executor,
+            max_workers=args.executor_workers,
+        )
+        with open(args.result, "w") as f:
+            json.dump(results, f)
+        sys.exit()
+
+    work_dir = Path(args.work_dir) if args.work_dir else Path(tempfile.mkdtemp(prefix="scghg-benchmark-"))
+    results = []
+    for size in args.sizes:
+        root = work_dir / f"n{size}"
+        if not (root / "generated_conf.yml").exists():
+            print(f"Generating synthetic inputs with {size} runids in {root}")
+            generate_inputs(root, n_runids=size, sectors=args.sectors, pulse_years=args.pulse_years)
+
+        print(f"Benchmarking {size} runids")
+        result_path = root / "benchmark.json"
+        subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                "--run", str(root.absolute()),
+                "--result", str(result_path.absolute()),
+                "--sectors", *args.sectors,
+                "--pulse-years", *[str(y) for y in args.pulse_years],
+                "--executor", args.executor,
+            ]
+            + (["--terr-us"] if args.terr_us else [])
+            + (["--executor-workers", str(args.executor_workers)] if args.executor_workers else []),
+            check=True,
+        )
+        with open(result_path) as f:
+            results += [dict(r, n_runids=size) for r in json.load(f)]
+
+    commit = git_commit()
+    label = args.label or f"{date.today().isoformat()}-{commit}"
+    output = Path(args.output)
+    output.mkdir(parents=True, exist_ok=True)
+    with open(output / f"{label}.json", "w") as f:
+        json.dump(
+            {
+                "label": label,
+                "commit": commit,
+                "date": date.today().isoformat(),
+                "machine": platform.node(),
+                "platform": platform.platform(),
+                "python": platform.python_version(),
+                "cpus": os.cpu_count(),
+                "settings": {
+                    "sectors": args.sectors,
+                    "pulse_years": args.pulse_years,
+                    "terr_us": args.terr_us,
+                    "executor": args.executor,
+                    "executor_workers": args.executor_workers,
+                },
+                "results": results,
+            },
+            f,
+            indent=1,
+        )
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    print_results(results, baseline)
+    print(f"Benchmark results saved to {output / f'{label}.json'}")
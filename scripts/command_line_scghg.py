@@ -2,12 +2,17 @@ import xarray as xr
 import dscim
 import yaml
 from dscim.menu.simple_storage import Climate, EconVars
+from input_cache import configure_input_cache, get_input_cache, DEFAULT_MAX_BYTES
+from sweep_executor import get_executor, worker_count
+from result_store import ResultStore, run_key
+from output_writers import DistributionWriter, netcdf_encoding
+from result_cube import ResultCube
+from instrumentation import get_recorder, run_labels, stage
 import pandas as pd
 import numpy as np
 from itertools import product
-from pathlib import Path
-import inquirer
-from pyfiglet import Figlet
+from functools import lru_cache
+from statistics import NormalDist
 from pathlib import Path
 import os
 import re
@@ -15,24 +20,27 @@ import subprocess
 from datetime import date
 import sys
 
-args = sys.argv
-if len(args) == 1:
-    conf_name = "generated_conf.yml"
-else:
-    conf_name = args[1]
-
+# Environment variable naming the config, which takes precedence over the command line. It is set by
+# scghg_api.load and inherited by worker processes
+CONF_ENV = "DSCIM_EPA_CONF"
 
+# Reads the config used by every run in this process and configures the input cache it sets
+def load_config(name):
+    global conf_name, master, conf, input_cache_bytes
+    conf_name = name
+    master = Path(os.getcwd()) / conf_name
+    try:
+        with open(master, "r") as stream:
+            conf = yaml.safe_load(stream)
+    except FileNotFoundError:
+        raise FileNotFoundError("Please run directory_setup.py or place the config in your current working directory")
 
-master = Path(os.getcwd()) / conf_name
-try:
-    with open(master, "r") as stream:
-        conf = yaml.safe_load(stream)
-except FileNotFoundError:
-    raise FileNotFoundError("Please run directory_setup.py or place the config in your current working directory")
+    # Inputs shared by every run in a sweep are loaded once and kept in memory
+    input_cache_bytes = conf["input_cache_gb"] * 1024**3 if "input_cache_gb" in conf else DEFAULT_MAX_BYTES
+    configure_input_cache(input_cache_bytes)
+    return conf
 
-coastal_v = str(conf["coastal_version"])
-mortality_v = str(conf["mortality_version"])
-CAMEL_v = f"CAMEL_m{mortality_v}_c{coastal_v}"
+load_config(os.environ.get(CONF_ENV) or (sys.argv[1] if len(sys.argv) > 1 else "generated_conf.yml"))
 
 discount_conversion_dict = {'1.016010255_9.149608e-05': '1.5% Ramsey',
                             '1.244459066_0.00197263997': '2.0% Ramsey',
@@ -40,13 +48,43 @@ discount_conversion_dict = {'1.016010255_9.149608e-05': '1.5% Ramsey',
 gas_conversion_dict = {'CO2_Fossil':'CO2',
                        'N2O':'N2O',
                        'CH4':'CH4'} 
+
+# Config keys that control how runs are executed but do not change results
+run_settings_keys = ['input_cache_gb',
+                     'executor',
+                     'executor_workers',
+                     'dask_scheduler_address',
+                     'result_store_path',
+                     'batch_discount_rates',
+                     'runid_chunk_size',
+                     'output_format',
+                     'timing_summary',
+                     'progressive_tolerance',
+                     'progressive_seed',
+                     'summary_quantiles']
+
+# Number of runids per batch of progressive runs, unless runid_chunk_size is given
+PROGRESSIVE_BATCH_SIZE = 500
+
+# Quantiles of the distributions of SCGHGs over runids saved in distribution summaries, unless summary_quantiles is given
+DEFAULT_SUMMARY_QUANTILES = [0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99]
     
 def makedir(path):
     if not os.path.exists(path):
         os.makedirs(path)
         
         
-def generate_meta(menu_item):
+# Short and full git commit hash, looked up once per process rather than for every run
+@lru_cache(maxsize=None)
+def git_commit():
+    try:
+        label = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD']).decode('ascii').strip()
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD']).decode('ascii').strip()
+    except (subprocess.CalledProcessError, OSError):
+        label, commit = "unknown", "unknown"
+    return label, commit
+
+def generate_meta(menu_item, terr_us=False):
     # find machine name
     machine_name = os.getenv("HOSTNAME")
     if machine_name is None:
@@ -56,10 +94,7 @@ def generate_meta(menu_item):
             machine_name = "unknown"
     
     # find git commit hash
-    try:
-        label = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD']).decode('ascii').strip()
-    except subprocess.CalledProcessError:
-        label = "unknown"
+    label, commit = git_commit()
     
     meta = {"Author": "Climate Impact Lab",
             "Date Created": date.today().strftime("%d/%m/%Y"),
@@ -75,12 +110,12 @@ def generate_meta(menu_item):
                 k: v
                 for k, v in attr_dict.items()
                 if (type(v) not in [xr.DataArray, xr.Dataset, pd.DataFrame])
-                and k not in ["damage_function", "logger"]
+                and k not in ["damage_function", "logger", "input_cache", "runids"]
             }
         )
 
     # update with git hash and machine name
-    meta.update(dict(machine=machine_name, commit=label,url="https://github.com/ClimateImpactLab/dscim-epa/commit/"+subprocess.check_output(['git','rev-parse','HEAD']).decode('ascii').strip()))
+    meta.update(dict(machine=machine_name, commit=label,url="https://github.com/ClimateImpactLab/dscim-epa/commit/"+commit))
 
     # convert to strs
     meta = {k: v if type(v) in [int, float] else str(v) for k, v in meta.items()}
@@ -129,11 +164,24 @@ def generate_meta(menu_item):
         meta['sector'] = re.split("_",meta['sector'])[0] 
         
     if terr_us:
-        meta.update(discounting_socioeconomics_path = f"{conf['rffdata']['socioec_output']}/rff_global_socioeconomics.nc4")
+        meta.update(discounting_socioeconomics_path = socioeconomics_path(conf, "global"))
       
     return meta
 
 
+# Labels eta or rho in stage timings; batched runs list every value
+def eta_label(value):
+    if isinstance(value, xr.DataArray):
+        return ",".join(str(v) for v in value.values)
+    return value
+
+# Short sector names used in output coordinates and file names
+def short_sector_name(sector):
+    if re.split("_",sector)[0]=="CAMEL":
+        return "combined"
+    else:
+        return re.split("_",sector)[0]
+
 # Merge attrs
 def merge_meta(attrs,meta):
     if len(attrs)==0:
@@ -148,24 +196,121 @@ def merge_meta(attrs,meta):
                 else:
                     attrs[meta_keys].append(meta[meta_keys])
     return attrs
-################################################################################
 
-# Function for one run of SCGHGs
-def epa_scghg(sector = "CAMEL_m1_c0.20",
-            terr_us = False,
-            eta = 2.0,
-            rho = 0.0,
-            pulse_year = 2020,
-            discount_type = "euler_ramsey",
-            menu_option = "risk_aversion"):
+# This class allows for a shorter naming convention for the damage function files (rounding etas and rhos in the filename)
+# When eta and rho are DataArrays along discount_rate (batched runs), the coefficients of each
+# [eta, rho] pair are stacked along the same dimension so that every rate is computed in one pass
+class RiskAversionRecipe(dscim.menu.risk_aversion.RiskAversionRecipe):
+    @property
+    def damage_function_coefficients(self) -> xr.Dataset:
+        """
+        Load damage function coefficients if the coefficients are provided by the user.
+        Otherwise, compute them.
+        """
+        if self.damage_function_path is not None:
+            if isinstance(self.eta, xr.DataArray):
+                return xr.concat(
+                    [self._open_coefficients(eta, rho) for eta, rho in zip(self.eta.values, self.rho.values)],
+                    dim=self.eta.discount_rate,
+                )
+            return self._open_coefficients(self.eta, self.rho)
+        else:
+            return self.damage_function["params"]
 
-    if menu_option != "risk_aversion":
-        raise Exception("DSCIM-EPA provides only 'risk_aversion' SCGHGs")
+    def calculate_discount_factors(self, cons_pc):
+        """
+        Discount factors of each [eta, rho] pair of a batched run, computed as in dscim.
+        """
+        if not isinstance(self.rho, xr.DataArray):
+            return super().calculate_discount_factors(cons_pc)
+
+        cons_pc = cons_pc.sel(year=slice(self.climate.pulse_year, self.ext_end_year))
+        rhos = self.rho if self.discrete_discounting else np.expm1(self.rho)
+        stream_rhos = 1 / ((rhos + 1) * xr.ones_like(cons_pc.year, dtype=float)).cumprod("year")
+        ratio = cons_pc.sel(year=self.climate.pulse_year) ** (self.eta) / cons_pc ** (self.eta)
+        return stream_rhos * ratio
+
+    @property
+    def global_consumption_no_pulse(self):
+        """
+        Global consumption no pulse, computed as in dscim and shared through the input cache with the recipes of
+        other pulse years. It depends on the pulse year only through its first year, since it is computed from the
+        anomalies without a pulse, so the recipe of the earliest pulse year computes it for every later one.
+        """
+        if '_gcnp' not in self.__dict__:
+            climate = self.climate
+            etas_rhos = list(zip(np.atleast_1d(self.eta).tolist(), np.atleast_1d(self.rho).tolist()))
+            runids = getattr(climate, "runids", None)
+            key = ("gcnp", str(self.damage_function_path), self.discounting_type, self.formula, tuple(etas_rhos),
+                   tuple(self.weitzman_parameter), None if runids is None else tuple(np.asarray(runids).tolist()))
+            paths = [self.econ_vars.path, climate.gmst_fair_path, climate.gmsl_fair_path]
+            paths += [self._coefficients_path(eta, rho) for eta, rho in etas_rhos]
+
+            def compute():
+                return dscim.menu.risk_aversion.RiskAversionRecipe.global_consumption_no_pulse.__func__(self)
+
+            gcnp = get_input_cache().derived(key, [p for p in paths if p is not None], compute)
+            # Shared gcnp starting after this pulse year, e.g. when pulse years are run in descending order, is not reused
+            if int(gcnp.year.min()) > climate.pulse_year:
+                gcnp = compute()
+            self._gcnp = gcnp.sel(year=slice(climate.pulse_year, None))
+        return self._gcnp
+
+    def _coefficients_path(self, eta, rho):
+        return f"{self.damage_function_path}/{self.NAME}_{self.discounting_type}_eta{round(eta,3)}_rho{round(rho,3)}_dfc.nc4"
+
+    def _open_coefficients(self, eta, rho):
+        # Coefficients are kept in memory, since every pulse year of a sweep reads the same files
+        coefficients = get_input_cache().dataset(self._coefficients_path(eta, rho))
+        # Runs over a chunk of runids only need the coefficients of that chunk
+        runids = getattr(self.climate, "runids", None)
+        if runids is not None and "runid" in coefficients.dims:
+            coefficients = coefficients.sel(runid = runids)
+        return coefficients
+
+# RFF socioeconomics of the "global" or "USA" domain, preferring a store written by prepare_inputs.py
+def socioeconomics_path(conf, domain):
+    path = Path(conf['rffdata']['socioec_output']) / f"rff_{domain}_socioeconomics.zarr"
+    return str(path) if path.exists() else f"{conf['rffdata']['socioec_output']}/rff_{domain}_socioeconomics.nc4"
+
+# Input files read by one run (or batched run) of SCGHGs, used to detect when a stored result is stale
+def run_input_paths(conf, run):
+    damage_function_library = Path(conf['paths']['rff_damage_function_library'])
+    sector = run['sector']
+    paths = [conf['rff_climate'][k] for k in ['gmst_fair_path', 'gmsl_fair_path', 'damages_pulse_conversion_path']]
+    paths += [socioeconomics_path(conf, "global")]
+    # Runs of both domains are named by their global sector
+    terr_us = run['terr_us'] or run.get('both_domains', False)
+    terr_us_sector = sector if run['terr_us'] else sector + "_USA"
+    if terr_us:
+        paths += [socioeconomics_path(conf, "USA")]
+    for eta, rho in run.get('etas_rhos', [[run.get('eta'), run.get('rho')]]):
+        dfc_name = f"{run['menu_option']}_{run['discount_type']}_eta{round(eta,3)}_rho{round(rho,3)}_dfc.nc4"
+        paths += [damage_function_library / (sector if not run['terr_us'] else sector[:-4]) / dfc_name]
+        if terr_us:
+            paths += [damage_function_library / terr_us_sector / dfc_name]
+    return paths
     
+################################################################################
+
+# Computes the uncollapsed SCGHGs, global consumption no pulse and the unnormalized adjustment factor
+# (ypc^-eta in the pulse year) of one run, optionally for a subset of runids only
+# The SCGHGs and recipes are returned by domain ("global" or "territorial_us"). If both_domains is set,
+# sector is the global sector name and the SCGHGs of both domains are computed from the same global
+# discount factors, gcnp and adjustment factor
+def scghg_components(sector,
+                     terr_us,
+                     eta,
+                     rho,
+                     pulse_year,
+                     discount_type,
+                     menu_option,
+                     runids = None,
+                     both_domains = False):
+
     # Read generated config
-    master = Path(os.getcwd()) / conf_name
-    with open(master, "r") as stream:
-        conf = yaml.safe_load(stream)
+    input_cache = get_input_cache()
+    conf = input_cache.read_yaml(master)
     
     # Manually add other config parameters that are not meant to change run to run
     conf["global_parameters"] = {'fair_aggregation': ["uncollapsed"],
@@ -173,128 +318,312 @@ def epa_scghg(sector = "CAMEL_m1_c0.20",
      'weitzman_parameter': [0.5],
      'save_files': []}
 
+    global_sector = sector if not terr_us else sector[:-4]
+    terr_us_sector = sector if terr_us else sector + "_USA"
 
-    # Read in U.S. and global socioeconomic files
-    if terr_us:
-        econ_terr_us = EconVars(
-            path_econ=f"{conf['rffdata']['socioec_output']}/rff_USA_socioeconomics.nc4"
-        )
-        # List of kwargs to add to kwargs read in from the config file for direct territorial U.S. damages
+    # Combines config kwargs with the kwargs of global discounting and damages or direct territorial U.S. damages
+    def recipe_kwargs(recipe_sector, econ_vars, damage_function_sector):
         add_kwargs = {
-            "econ_vars": econ_terr_us,
-            "climate_vars": Climate(**conf["rff_climate"], pulse_year=pulse_year),
-            "formula": conf["sectors"][sector if not terr_us else sector[:-4]]["formula"],
+            "econ_vars": econ_vars,
+            "climate_vars": input_cache.climate(pulse_year, runids = runids, **conf["rff_climate"]),
+            "formula": conf["sectors"][global_sector]["formula"],
             "discounting_type": discount_type,
-            "sector": sector,
+            "sector": recipe_sector,
             "ce_path": None,
             "save_path": None,
             "eta": eta,
             "rho": rho,
-            "damage_function_path": Path(conf['paths']['rff_damage_function_library'])  / sector,
+            "damage_function_path": Path(conf['paths']['rff_damage_function_library']) / damage_function_sector,
             "ecs_mask_path": None,
             "ecs_mask_name": None,
             "fair_dims":[],
         }
-
-        # An extra set of kwargs is needed when running U.S. SCGHGs
-        # Combine config kwargs with the add_kwargs for direct territorial U.S. damages
-        kwargs_terr_us = conf["global_parameters"].copy()
+        kwargs = conf["global_parameters"].copy()
         for k, v in add_kwargs.items():
             assert (
-                k not in kwargs_terr_us.keys()
+                k not in kwargs.keys()
             ), f"{k} already set in config. Please check `global_parameters`."
-            kwargs_terr_us.update({k: v})
+            kwargs.update({k: v})
+        return kwargs
 
-
-    econ_glob = EconVars(
-        path_econ=f"{conf['rffdata']['socioec_output']}/rff_global_socioeconomics.nc4"
+    # Read in U.S. and global socioeconomic files
+    econ_glob = input_cache.econ_vars(
+        socioeconomics_path(conf, "global"), runids = runids
     )
+    if terr_us or both_domains:
+        econ_terr_us = input_cache.econ_vars(
+            socioeconomics_path(conf, "USA"), runids = runids
+        )
 
-    # This class allows for a shorter naming convention for the damage function files (rounding etas and rhos in the filename)
-    class RiskAversionRecipe(dscim.menu.risk_aversion.RiskAversionRecipe):
-        @property
-        def damage_function_coefficients(self) -> xr.Dataset:
-            """
-            Load damage function coefficients if the coefficients are provided by the user.
-            Otherwise, compute them.
-            """
-            if self.damage_function_path is not None:
-                return xr.open_dataset(
-                    f"{self.damage_function_path}/{self.NAME}_{self.discounting_type}_eta{round(self.eta,3)}_rho{round(self.rho,3)}_dfc.nc4"
-                )
-            else:
-                return self.damage_function["params"]
-
-    # List of kwargs to add to kwargs read in from the config file for global discounting and damages
-    add_kwargs = {
-        "econ_vars": econ_glob,
-        "climate_vars": Climate(**conf["rff_climate"], pulse_year=pulse_year),
-        "formula": conf["sectors"][sector if not terr_us else sector[:-4]]["formula"],
-        "discounting_type": discount_type,
-        "sector": sector,
-        "ce_path": None,
-        "save_path": None,
-        "eta": eta,
-        "rho": rho,
-        "damage_function_path": Path(conf['paths']['rff_damage_function_library']) / [sector if not terr_us else sector[:-4]][0], 
-        "ecs_mask_path": None,
-        "ecs_mask_name": None,
-        "fair_dims":[],
-    }
-
-    # Combine config kwargs with the add_kwargs for global discounting and damages
-    kwargs_global = conf["global_parameters"].copy()
-    for k, v in add_kwargs.items():
-        assert (
-            k not in kwargs_global.keys()
-        ), f"{k} already set in config. Please check `global_parameters`."
-        kwargs_global.update({k: v})
-
-    # For both territorial U.S. and global SCGHGs, endogenous Ramsey discounting based on global socioeconomics is used
-    menu_item_global = RiskAversionRecipe(**kwargs_global)
-    df = menu_item_global.uncollapsed_discount_factors
-
-    # Compute damages for global or U.S. runs
-    if terr_us:
-        menu_item_terr_us = RiskAversionRecipe(**kwargs_terr_us)
-        md = menu_item_terr_us.uncollapsed_marginal_damages
-    else:
-        md = menu_item_global.uncollapsed_marginal_damages
+    with stage("load_inputs"):
+        # For both territorial U.S. and global SCGHGs, endogenous Ramsey discounting based on global socioeconomics is used
+        menu_item_global = RiskAversionRecipe(**recipe_kwargs(sector, econ_glob, global_sector))
+        menu_items = {}
+        if not terr_us:
+            menu_items["global"] = menu_item_global
+        if terr_us or both_domains:
+            menu_items["territorial_us"] = RiskAversionRecipe(**recipe_kwargs(terr_us_sector, econ_terr_us, terr_us_sector))
+
+        # Loads the climate and socioeconomic inputs (or fetches them from the input cache) up front,
+        # so that their cost is not counted in the stages below
+        for recipe in {menu_item_global, *menu_items.values()}:
+            recipe.climate.anomalies
+            recipe.climate.conversion
+            recipe.econ_vars.econ_vars
+
+        # Isolate population from socioeconomics
+        pop = input_cache.population(socioeconomics_path(conf, "global"))
+        if runids is not None:
+            pop = pop.sel(runid = runids)
+
+    with stage("discount_factors"):
+        df = menu_item_global.uncollapsed_discount_factors
 
     # The 113.648/112.29 deflates the SCGHGs from 2019 dollars to 2020 dollars
     conv_2019to2020 = 113.648/112.29
-    
-    # Compute SCGHGs
-    # Multiplying marginal damages by discount factors and summing across years creates the SCGHGs
-    scghgs = (
-        (md.rename(marginal_damages = 'scghg') * df.rename(discount_factor = 'scghg'))
-        .sum("year")* conv_2019to2020
-    )     
+
+    scghgs = {}
+    for domain, menu_item in menu_items.items():
+        # Compute damages for global or U.S. runs
+        with stage("marginal_damages"):
+            md = menu_item.uncollapsed_marginal_damages
+
+        # Compute SCGHGs
+        # Multiplying marginal damages by discount factors and summing across years creates the SCGHGs
+        with stage("year_sum"):
+            scghgs[domain] = (
+                (md.rename(marginal_damages = 'scghg') * df.rename(discount_factor = 'scghg'))
+                .sum("year")* conv_2019to2020
+            )     
         
     # Code to calculate epa-spec adjustment factors
-    gcnp = menu_item_global.global_consumption_no_pulse.rename('gcnp')
+    with stage("global_consumption_no_pulse"):
+        gcnp = menu_item_global.global_consumption_no_pulse.rename('gcnp')
 
-    # Isolate population from socioeconomics
-    pop = xr.open_dataset(f"{conf['rffdata']['socioec_output']}/rff_global_socioeconomics.nc4").sel(region = 'world', drop = True).pop
-    
-    # Calculate global consumption no pulse per population
-    a = xr.merge([pop, gcnp])  
-    ypv = a.gcnp/a.pop
+    with stage("adjustment_factor"):
+        # Calculate global consumption no pulse per population
+        a = xr.merge([pop, gcnp])  
+        ypv = a.gcnp/a.pop
 
-    # Create adjustment factor using adjustment.factor = (ypc^-eta)/mean(ypc^-eta)
-    c = np.power(ypv, -eta).sel(year = pulse_year, drop = True)
-    adj = (c/c.mean()).rename('adjustment_factor')
+        # Numerator of the adjustment factor, adjustment.factor = (ypc^-eta)/mean(ypc^-eta)
+        c = np.power(ypv, -eta).sel(year = pulse_year, drop = True)
 
-    # Merge adjustments with uncollapsed scghgs
-    adjustments = xr.merge([scghgs,adj.to_dataset()])          
-    
-    # generate attrs           
-    if terr_us:
-        meta = generate_meta(menu_item_terr_us)
-    else:
-        meta = generate_meta(menu_item_global)
+    return scghgs, gcnp, c, menu_items
 
-    return([adjustments, gcnp* conv_2019to2020, meta])
+# Function for one run of SCGHGs
+# If runid_chunk_size is set, runids are processed in chunks of that size and only the certainty equivalent
+# SCGHGs are returned, so that peak memory is set by the chunk size rather than the number of runids
+# If tolerance is set, runids are processed in batches in a random order fixed by seed, and the run stops once the
+# confidence interval of every certainty equivalent SCGHG is within tolerance of it (relative). The SCGHGs are then
+# returned with their standard errors (scghg_se) and the number of runids used (n_runids)
+# If both_domains is set, sector is the global sector name and the results of the global and territorial U.S.
+# SCGHGs are returned by domain, {"global": [...], "territorial_us": [...]}, sharing one gcnp and adjustment factor
+# If quantiles is set, the SCGHGs are returned with summaries of their distributions over runids (see
+# distribution_summary), which runs over chunks of runids compute from the SCGHGs of every chunk
+# If return_gcnp is not set, None is returned in place of gcnp, which sweeps only save from the runs of one pulse year
+def epa_scghg(sector = "CAMEL_m1_c0.20",
+            terr_us = False,
+            eta = 2.0,
+            rho = 0.0,
+            pulse_year = 2020,
+            discount_type = "euler_ramsey",
+            menu_option = "risk_aversion",
+            runid_chunk_size = None,
+            both_domains = False,
+            tolerance = None,
+            seed = 0,
+            confidence = 0.95,
+            quantiles = None,
+            return_gcnp = True):
+
+    if menu_option != "risk_aversion":
+        raise Exception("DSCIM-EPA provides only 'risk_aversion' SCGHGs")
+    if both_domains and terr_us:
+        raise ValueError("Runs of both domains take the global sector name and terr_us = False")
+
+    # The 113.648/112.29 deflates the SCGHGs from 2019 dollars to 2020 dollars
+    conv_2019to2020 = 113.648/112.29
+
+    run = dict(sector = sector,
+               terr_us = terr_us,
+               eta = eta,
+               rho = rho,
+               pulse_year = pulse_year,
+               discount_type = discount_type,
+               menu_option = menu_option)
+
+    # Stage timings recorded during this run are labelled with its parameters
+    labels = dict(run, eta = eta_label(eta), rho = eta_label(rho))
+    with run_labels(**labels):
+        if runid_chunk_size is None and tolerance is None:
+            scghgs, gcnp, c, menu_items = scghg_components(**run, both_domains = both_domains)
+
+            # Create adjustment factor using adjustment.factor = (ypc^-eta)/mean(ypc^-eta)
+            # The mean is taken separately for each discount rate of a batched run
+            adj = (c/c.mean([d for d in c.dims if d != 'discount_rate'])).rename('adjustment_factor')
+
+            # Merge adjustments with uncollapsed scghgs
+            adjustments = {domain: xr.merge([scghgs[domain], adj.to_dataset()]) for domain in scghgs}
+            if quantiles is not None:
+                for domain in adjustments:
+                    adjustments[domain] = xr.merge([adjustments[domain], distribution_summary(scghgs[domain].scghg, c, quantiles)])
+        else:
+            # Since adjustment.factor = c/mean(c), the mean over runids of adjustment.factor * scghg
+            # equals sum(c * scghg)/sum(c), which can be accumulated one chunk of runids at a time
+            conf = get_input_cache().read_yaml(master)
+            all_runids = get_input_cache().runids(socioeconomics_path(conf, "global"))
+            if tolerance is not None:
+                # Progressive runs visit the runids in a random but reproducible order, so that every
+                # batch extends a simple random sample of them
+                all_runids = np.random.default_rng(seed).permutation(all_runids)
+                runid_chunk_size = runid_chunk_size or PROGRESSIVE_BATCH_SIZE
+                z = NormalDist().inv_cdf((1 + confidence) / 2)
+            numerator = {}
+            denominator = 0
+            # Further sums over runids of progressive runs, for the standard errors
+            sums = {}
+            all_gcnp = []
+            # Uncollapsed SCGHGs and adjustment factor numerators of every chunk, for distribution summaries.
+            # These have one value per runid, so are small next to the inputs of a chunk
+            all_scghgs = {}
+            all_c = []
+            for start in range(0, len(all_runids), runid_chunk_size):
+                scghgs, gcnp, c, menu_items = scghg_components(**run, runids = all_runids[start:start + runid_chunk_size], both_domains = both_domains)
+                for domain in scghgs:
+                    numerator[domain] = numerator.get(domain, 0) + (c * scghgs[domain].scghg).sum('runid')
+                denominator = denominator + c.sum('runid')
+                if return_gcnp:
+                    all_gcnp.append(gcnp)
+                if quantiles is not None:
+                    for domain in scghgs:
+                        all_scghgs.setdefault(domain, []).append(scghgs[domain].scghg)
+                    all_c.append(c)
+
+                if tolerance is not None:
+                    n_runids = min(start + runid_chunk_size, len(all_runids))
+                    sums['xx'] = sums.get('xx', 0) + (c * c).sum('runid')
+                    for domain in scghgs:
+                        cs = c * scghgs[domain].scghg
+                        sums[domain, 'yy'] = sums.get((domain, 'yy'), 0) + (cs * cs).sum('runid')
+                        sums[domain, 'xy'] = sums.get((domain, 'xy'), 0) + (c * cs).sum('runid')
+                    se = {domain: ratio_standard_error(n_runids, len(all_runids), denominator, sums['xx'],
+                                                       numerator[domain], sums[domain, 'yy'], sums[domain, 'xy'])
+                          for domain in numerator}
+                    precision_reached = max(
+                        float((z * se[domain] / abs(numerator[domain] / denominator)).max()) for domain in numerator
+                    )
+                    if n_runids > runid_chunk_size and precision_reached <= tolerance:
+                        break
+
+            # Certainty equivalent scghgs, in place of the uncollapsed scghgs and adjustment factors
+            adjustments = {domain: (numerator[domain] / denominator).rename('scghg').to_dataset() for domain in numerator}
+            if tolerance is not None:
+                print(f"{n_runids} of {len(all_runids)} runids used, {confidence:.0%} confidence interval within {precision_reached:.2%} of the scghgs")
+                for domain in adjustments:
+                    adjustments[domain]['scghg_se'] = se[domain]
+                    adjustments[domain]['n_runids'] = n_runids
+            if quantiles is not None:
+                c = xr.concat(all_c, dim = 'runid')
+                for domain in adjustments:
+                    summary = distribution_summary(xr.concat(all_scghgs[domain], dim = 'runid'), c, quantiles)
+                    adjustments[domain] = xr.merge([adjustments[domain], summary])
+            gcnp = xr.concat(all_gcnp, dim = 'runid').sortby('runid') if return_gcnp else None
+
+        # generate attrs           
+        with stage("generate_meta"):
+            meta = {}
+            for domain, menu_item in menu_items.items():
+                if isinstance(eta, xr.DataArray):
+                    # Batched runs return the attrs each [eta, rho] pair would have had as a separate run
+                    meta[domain] = []
+                    for eta_i, rho_i in zip(eta.values, rho.values):
+                        menu_item.eta, menu_item.rho = float(eta_i), float(rho_i)
+                        meta[domain].append(generate_meta(menu_item, domain == "territorial_us"))
+                else:
+                    meta[domain] = generate_meta(menu_item, domain == "territorial_us")
+
+    gcnp = gcnp* conv_2019to2020 if return_gcnp else None
+    results = {domain: [adjustments[domain], gcnp, meta[domain]] for domain in menu_items}
+    if both_domains:
+        return results
+    return results["territorial_us" if terr_us else "global"]
+
+# Standard error of the ratio sum(y)/sum(x) over all n_total runids, estimated from a simple random sample of n of
+# them by the delta method, given the sums of x, x^2, y, y^2 and x*y over the sample. Here x is the numerator
+# of the adjustment factor and y the numerator times the uncollapsed scghg, whose ratio is the certainty
+# equivalent scghg
+def ratio_standard_error(n, n_total, sx, sxx, sy, syy, sxy):
+    if n < 2:
+        return np.inf * sy
+    r = sy / sx
+    # Sample variance of the residuals y - r * x, which sum to zero
+    var = np.maximum(syy - 2 * r * sxy + r**2 * sxx, 0) / (n - 1)
+    return np.sqrt((1 - n / n_total) * var / n) / (sx / n)
+
+# Certainty equivalent SCGHGs from the uncollapsed SCGHGs and adjustment factors of one or more runs.
+# Runs over chunks of runids return them already collapsed
+def collapse_scghgs(ds):
+    if 'adjustment_factor' in ds:
+        return (ds.adjustment_factor * ds.scghg).mean(dim = 'runid')
+    return ds.scghg
+
+# Quantiles, mean and variance of the uncollapsed SCGHGs over runids, and their mean and variance weighted by the
+# adjustment factor, whose numerator c is passed as weights. The weighted mean is the certainty equivalent SCGHG
+# Summaries are named summary_<statistic>, to be kept apart from the SCGHGs
+def distribution_summary(scghg, c, quantiles = DEFAULT_SUMMARY_QUANTILES):
+    weights = c / c.sum('runid')
+    mean = scghg.mean('runid')
+    weighted_mean = (weights * scghg).sum('runid')
+    return xr.Dataset({'summary_quantile': scghg.quantile(quantiles, dim = 'runid'),
+                       'summary_mean': mean,
+                       'summary_variance': scghg.var('runid', ddof = 1),
+                       'summary_weighted_mean': weighted_mean,
+                       'summary_weighted_variance': (weights * (scghg - weighted_mean)**2).sum('runid')})
+
+# Distribution summaries of one pulse year as a table with one row per gas, discount rate, sector, etc.
+# and one column per statistic and quantile
+def summary_table(summary, pulse_year):
+    quantiles = summary.summary_quantile.to_series().unstack('quantile')
+    quantiles.columns = [f"q{q:g}" for q in quantiles.columns]
+    moments = summary.drop_vars(['summary_quantile', 'quantile']).to_dataframe(dim_order = list(quantiles.index.names))
+    moments.columns = [name.removeprefix('summary_') for name in moments.columns]
+    table = moments.join(quantiles).reset_index()
+    table.insert(table.columns.get_loc('gas') + 1, 'pulse_year', pulse_year)
+    return table
+
+# Function for one run of SCGHGs over several discount rates at once
+# eta and rho are passed to the recipe as arrays along a discount_rate dimension, so the discount factors,
+# marginal damages, gcnp and adjustment factors of all rates are computed together instead of once per rate
+def epa_scghg_batched(sector = "CAMEL_m1_c0.20",
+                      terr_us = False,
+                      etas_rhos = ([1.016010255, 9.149608e-05], [1.244459066, 0.00197263997], [1.421158116, 0.00461878399]),
+                      pulse_year = 2020,
+                      discount_type = "euler_ramsey",
+                      menu_option = "risk_aversion",
+                      runid_chunk_size = None,
+                      both_domains = False,
+                      tolerance = None,
+                      seed = 0,
+                      quantiles = None,
+                      return_gcnp = True):
+
+    discount_rate = pd.Index([discount_conversion_dict[str(eta) + "_" + str(rho)] for eta, rho in etas_rhos], name = 'discount_rate')
+    eta = xr.DataArray([eta for eta, rho in etas_rhos], coords = {'discount_rate': discount_rate}, dims = ['discount_rate'])
+    rho = xr.DataArray([rho for eta, rho in etas_rhos], coords = {'discount_rate': discount_rate}, dims = ['discount_rate'])
+
+    return epa_scghg(sector = sector,
+                     terr_us = terr_us,
+                     eta = eta,
+                     rho = rho,
+                     pulse_year = pulse_year,
+                     discount_type = discount_type,
+                     menu_option = menu_option,
+                     runid_chunk_size = runid_chunk_size,
+                     both_domains = both_domains,
+                     tolerance = tolerance,
+                     seed = seed,
+                     quantiles = quantiles,
+                     return_gcnp = return_gcnp)
 
 # Function to perform multiple runs of SCGHGs and combine into one file to save out
 def epa_scghgs(sectors,
@@ -303,234 +632,423 @@ def epa_scghgs(sectors,
              risk_combos = (('risk_aversion', 'euler_ramsey')),
              pulse_years = (2020,2030,2040,2050,2060,2070,2080),
              gcnp = False,
-             uncollapsed = False):
+             uncollapsed = False,
+             executor = None,
+             result_store = None,
+             batch_discount_rates = False,
+             runid_chunk_size = None,
+             output_format = "csv",
+             both_domains = False,
+             progressive_tolerance = None,
+             progressive_seed = 0,
+             summary_quantiles = None):
 
     # Read generated config    
-    master = Path(os.getcwd()) / conf_name
-    with open(master, "r") as stream:
-        conf = yaml.safe_load(stream)
+    conf = get_input_cache().read_yaml(master)
+
+    # With both_domains, sectors are global sector names and every run also computes the territorial U.S.
+    # SCGHGs, from the same global discount factors, gcnp and adjustment factors. Each domain is saved
+    # as if by its own sweep
+    if both_domains and terr_us:
+        raise ValueError("Sweeps of both domains take global sector names and terr_us = False")
+    domains = ["global", "territorial_us"] if both_domains else ["territorial_us" if terr_us else "global"]
+    domain_names = {"global": "global", "territorial_us": "territorial U.S."}
+
+    # Progressive runs stop before using every runid, so they cannot save the full distributions
+    if progressive_tolerance is not None and uncollapsed:
+        raise ValueError("Progressive runs (progressive_tolerance) cannot save uncollapsed SCGHGs. "
+                         "Unset progressive_tolerance or do not select uncollapsed SCGHGs.")
         
-    attrs={}
+    attrs = {domain: {} for domain in domains}
+
+    # Full distributions are appended to a single Parquet dataset or Zarr store per sector unless saved as csv
+    distribution_writers = {}
+
+    # Distribution summaries of every pulse year so far, saved as one table per domain
+    summary_tables = {domain: [] for domain in domains}
+
+    # Each run is independent until results are combined, so every run of the sweep is
+    # handed to the executor up front. Results come back in the order below no matter
+    # how the runs are scheduled, which keeps the combined files and attrs deterministic
+    if executor is None:
+        executor = get_executor("serial")
+    if batch_discount_rates:
+        # One run per sector computes all discount rates together
+        run_function = epa_scghg_batched
+        runs = [dict(sector = sector,
+                     terr_us = terr_us,
+                     discount_type = j[1],
+                     menu_option = j[0],
+                     etas_rhos = [list(i) for i in etas_rhos],
+                     pulse_year = pulse_year)
+                for j, pulse_year in product(risk_combos, pulse_years)
+                for sector in sectors]
+    else:
+        run_function = epa_scghg
+        runs = [dict(sector = sector,
+                     terr_us = terr_us,
+                     discount_type = j[1],
+                     menu_option = j[0],
+                     eta = i[0],
+                     rho = i[1],
+                     pulse_year = pulse_year)
+                for j, pulse_year in product(risk_combos, pulse_years)
+                for i, sector in product(etas_rhos, sectors)]
+
+    # Runids can only be processed in chunks when the full distributions are not saved
+    if runid_chunk_size is not None and not uncollapsed:
+        for run in runs:
+            run.update(runid_chunk_size = runid_chunk_size)
+
+    if both_domains:
+        for run in runs:
+            run.update(both_domains = True)
+
+    # Progressive runs, like runs in chunks, only return certainty equivalent SCGHGs
+    if progressive_tolerance is not None:
+        for run in runs:
+            run.update(tolerance = progressive_tolerance, seed = progressive_seed)
+
+    # Global consumption no pulse only differs across pulse years in its first year, so it is only returned by,
+    # and saved from, the runs of the earliest pulse year, which cover every year of the others
+    gcnp_pulse_year = min(pulse_years) if gcnp else None
+    for run in runs:
+        if run['pulse_year'] != gcnp_pulse_year:
+            run.update(return_gcnp = False)
+
+    # Distribution summaries are computed by the runs, alongside the SCGHGs, so they need no uncollapsed SCGHGs
+    if summary_quantiles is not None:
+        for run in runs:
+            run.update(quantiles = list(summary_quantiles))
+
+    if result_store is None:
+        results = executor.map(run_function, runs)
+    else:
+        # Runs already in the store are loaded instead of recomputed
+        conf_key = {k: v for k, v in conf.items() if k not in run_settings_keys}
+        keys = [run_key(run,
+                        conf_key,
+                        run_input_paths(conf, run),
+                        dscim = dscim.__version__)
+                for run in runs]
+        results = result_store.map(executor, run_function, runs, keys)
+
+    # Results of each domain, as returned by runs of both domains
+    def by_domain(result):
+        return result if both_domains else {domains[0]: result}
 
     # Nested for loops to run each combination of SCGHGs requested
     # Each run of the outer loop saves one set of SCGHGs
     # The inner loop combines all SCGHG runs for that file
     for j, pulse_year in product(risk_combos, pulse_years):
-        # These arrays will be populated with data arrays to be combined
-        all_arrays_uscghg = []
-        all_arrays_gcnp = []
-
         discount_type= j[1]
         menu_option = j[0]
-        for i, sector in product(etas_rhos, sectors):
+
+        # These arrays are allocated once and populated with the result of each run
+        # Global consumption no pulse is the same for both domains and is kept once
+        run_coords = dict(discount_rate = [discount_conversion_dict[str(i[0]) + "_" + str(i[1])] for i in etas_rhos],
+                          menu_option = [menu_option],
+                          sector = [short_sector_name(sector) for sector in sectors])
+        uscghg_cubes = {domain: ResultCube(**run_coords) for domain in domains}
+        gcnp_cube = ResultCube(**run_coords) if pulse_year == gcnp_pulse_year else None
+
+        # Batched results hold every discount rate of a sector and are split up below
+        if batch_discount_rates:
+            batched = {sector: by_domain(next(results)) for sector in sectors}
+
+        for (rate, i), sector in product(enumerate(etas_rhos), sectors):
             
-            if re.split("_",sector)[0]=="CAMEL":
-                sector_short = "combined"
-            else:
-                sector_short = re.split("_",sector)[0]
+            sector_short = short_sector_name(sector)
                 
             eta = i[0]
             rho = i[1]
 
-            print(f"Calculating {'territorial U.S.' if terr_us else 'global'} {sector_short} scghgs {'and gcnp' if gcnp else ''} \n discount rate: {discount_conversion_dict[str(eta) + '_' + str(rho)]} \n pulse year: {pulse_year}")
-            df_single_scghg, df_single_gcnp, meta = epa_scghg(sector = sector,
-                                                          terr_us = terr_us,
-                                                          discount_type = discount_type,
-                                                          menu_option = menu_option,
-                                                          eta = eta,
-                                                          rho = rho,
-                                                          pulse_year = pulse_year)
+            print(f"Calculating {' and '.join(domain_names[d] for d in domains)} {sector_short} scghgs {'and gcnp' if gcnp_cube is not None else ''} \n discount rate: {discount_conversion_dict[str(eta) + '_' + str(rho)]} \n pulse year: {pulse_year}")
+            if batch_discount_rates:
+                run_results = {domain: [df_single_scghg.isel(discount_rate = rate, drop = True),
+                                        None if df_single_gcnp is None else df_single_gcnp.isel(discount_rate = rate, drop = True),
+                                        meta[rate]]
+                               for domain, (df_single_scghg, df_single_gcnp, meta) in batched[sector].items()}
+            else:
+                run_results = by_domain(next(results))
             
-            # Creates new coordinates to differentiate between runs
-            # For SCGHGs
-            df_scghg = df_single_scghg.assign_coords(discount_rate =  discount_conversion_dict[str(eta) + "_" + str(rho)], menu_option = menu_option, sector = sector_short)
-            df_scghg_expanded = df_scghg.expand_dims(['discount_rate','menu_option', 'sector'])
-            if 'simulation' in df_scghg_expanded.dims:
-                df_scghg_expanded = df_scghg_expanded.drop_vars('simulation')
-            all_arrays_uscghg = all_arrays_uscghg + [df_scghg_expanded]
+            # Writes each run into its slice of the output arrays, labelled to differentiate between runs
+            cube_labels = dict(discount_rate = discount_conversion_dict[str(eta) + "_" + str(rho)], menu_option = menu_option, sector = sector_short)
+            for domain, (df_single_scghg, df_single_gcnp, meta) in run_results.items():
+                # For SCGHGs
+                if 'simulation' in df_single_scghg.dims:
+                    df_single_scghg = df_single_scghg.drop_vars('simulation')
+                uscghg_cubes[domain].insert(df_single_scghg, **cube_labels)
+
+                attrs[domain] = merge_meta(attrs[domain],meta)
 
             # For global consumption no pulse
-            df_gcnp = df_single_gcnp.assign_coords(discount_rate =  discount_conversion_dict[str(eta) + "_" + str(rho)], menu_option = menu_option, sector = sector_short)
-            df_gcnp_expanded = df_gcnp.expand_dims(['discount_rate','menu_option', 'sector'])
-            if 'simulation' in df_gcnp_expanded.dims:
-                df_gcnp_expanded = df_gcnp_expanded.drop_vars('simulation')
-            all_arrays_gcnp = all_arrays_gcnp + [df_gcnp_expanded]    
-        
-            attrs = merge_meta(attrs,meta)
+            if gcnp_cube is not None:
+                if 'simulation' in df_single_gcnp.dims:
+                    df_single_gcnp = df_single_gcnp.drop_vars('simulation')
+                gcnp_cube.insert(df_single_gcnp, **cube_labels)
         
         print("Processing...")
-        df_full_scghg = xr.combine_by_coords(all_arrays_uscghg)
-        df_full_gcnp = xr.combine_by_coords(all_arrays_gcnp)
-        
-        # Changes coordinate names of gases
-        df_full_scghg = df_full_scghg.assign_coords(gas=[gas_conversion_dict[gas] for gas in df_full_scghg.gas.values])
-        df_full_gcnp = df_full_gcnp.assign_coords(gas=[gas_conversion_dict[gas] for gas in df_full_gcnp.gas.values])
-        
         # Splits SCGHGs by gas and saves them out separately
         # For uncollapsed SCGHGs
-        if conf_name != "generated_conf.yml":
-            conf_savename = re.split('\.', conf_name)[0] + "-"
+        if Path(conf_name).name != "generated_conf.yml":
+            conf_savename = Path(conf_name).stem + "-"
         else:
             conf_savename = ""
         gases = ['CO2','CH4', 'N2O']
-        if uncollapsed:    
-            for gas in gases:
-                out_dir = Path(conf['save_path']) / f"{'territorial_us' if terr_us else 'global'}_scghgs" / 'full_distributions' / gas 
-                makedir(out_dir)
-                uncollapsed_gas_scghgs = df_full_scghg.sel(gas = gas, drop = True).to_dataframe().reindex()
-                print(f"Saving {'territorial U.S.' if terr_us else 'global'} uncollapsed {sector_short} sc-{gas} \n pulse year: {pulse_year}")
-                uncollapsed_gas_scghgs.to_csv(out_dir / f"{conf_savename}sc-{gas}-dscim-{sector_short}-{pulse_year}-n10000.csv")
-                attrs_save = attrs.copy()
-                attrs_save['gases'] = gas
-                with open(out_dir / f"{conf_savename}attributes-{gas}-{sector_short}.txt", 'w') as f: 
-                    for key, value in attrs_save.items(): 
+        for domain in domains:
+            with stage("combine", sector = sector_short, pulse_year = pulse_year):
+                df_full_scghg = uscghg_cubes[domain].to_xarray()
+            
+                # Changes coordinate names of gases
+                df_full_scghg = df_full_scghg.assign_coords(gas=[gas_conversion_dict[gas] for gas in df_full_scghg.gas.values])
+
+                # Separates distribution summaries from the SCGHGs
+                summary_vars = [v for v in df_full_scghg.data_vars if v.startswith('summary_')]
+                df_summary = df_full_scghg[summary_vars]
+                df_full_scghg = df_full_scghg.drop_vars(summary_vars + (['quantile'] if summary_vars else []))
+
+            with stage("write_uncollapsed", sector = sector_short, pulse_year = pulse_year):
+                if uncollapsed and output_format != "csv":
+                    out_dir = Path(conf['save_path']) / f"{domain}_scghgs" / 'full_distributions'
+                    makedir(out_dir)
+                    if domain not in distribution_writers:
+                        distribution_writers[domain] = DistributionWriter(out_dir / f"{conf_savename}sc-ghg-dscim-{sector_short}-n10000.{output_format}", output_format)
+                    print(f"Saving {domain_names[domain]} uncollapsed {sector_short} scghgs \n pulse year: {pulse_year}")
+                    distribution_writers[domain].write(df_full_scghg, pulse_year, attrs = attrs[domain])
+                    with open(out_dir / f"{conf_savename}attributes-{sector_short}.txt", 'w') as f: 
+                        for key, value in attrs[domain].items(): 
+                            f.write('%s:%s\n' % (key, value))
+                elif uncollapsed:    
+                    for gas in gases:
+                        out_dir = Path(conf['save_path']) / f"{domain}_scghgs" / 'full_distributions' / gas 
+                        makedir(out_dir)
+                        uncollapsed_gas_scghgs = df_full_scghg.sel(gas = gas, drop = True).to_dataframe().reindex()
+                        print(f"Saving {domain_names[domain]} uncollapsed {sector_short} sc-{gas} \n pulse year: {pulse_year}")
+                        uncollapsed_gas_scghgs.to_csv(out_dir / f"{conf_savename}sc-{gas}-dscim-{sector_short}-{pulse_year}-n10000.csv")
+                        attrs_save = attrs[domain].copy()
+                        attrs_save['gases'] = gas
+                        with open(out_dir / f"{conf_savename}attributes-{gas}-{sector_short}.txt", 'w') as f: 
+                            for key, value in attrs_save.items(): 
+                                f.write('%s:%s\n' % (key, value))
+
+            with stage("write_collapsed", sector = sector_short, pulse_year = pulse_year):
+                # Applies the adjustment factor to convert to certainty equivalent SCGHGs
+                # Progressive runs also save the standard errors and numbers of runids used
+                progress = [v for v in ['scghg_se', 'n_runids'] if v in df_full_scghg]
+                collapsed_scghg = collapse_scghgs(df_full_scghg).rename('scghg')
+                dim_order = [dim for dim in collapsed_scghg.dims if dim != 'gas']
+                df_full_scghg = xr.merge([collapsed_scghg, df_full_scghg[progress]])
+
+                # Splits and saves collapsed SCGHGs
+                for gas in gases:
+                    out_dir = Path(conf['save_path']) / f"{domain}_scghgs"   
+                    makedir(out_dir)
+                    collapsed_gas_scghg = df_full_scghg.sel(gas = gas, drop = True).to_dataframe(dim_order = dim_order).reindex() 
+                    print(f"Saving {domain_names[domain]} collapsed {sector_short} sc-{gas} \n pulse year: {pulse_year}")
+                    collapsed_gas_scghg.to_csv(out_dir / f"{conf_savename}sc-{gas}-dscim-{sector_short}-{pulse_year}.csv") 
+
+                # Creates attribute files 
+                with open(out_dir / f"attributes-{sector_short}.txt", 'w') as f: 
+                    for key, value in attrs[domain].items(): 
                         f.write('%s:%s\n' % (key, value))
 
-        # Applies the adjustment factor to convert to certainty equivalent SCGHGs
-        df_full_scghg = (df_full_scghg.adjustment_factor * df_full_scghg.scghg).mean(dim = 'runid')
+            if summary_vars:
+                with stage("write_summary", sector = sector_short, pulse_year = pulse_year):
+                    # Rewritten after every pulse year, so that summaries are saved as soon as each pulse year finishes
+                    summary_tables[domain].append(summary_table(df_summary, pulse_year))
+                    print(f"Saving {domain_names[domain]} {sector_short} distribution summaries \n pulse year: {pulse_year}")
+                    pd.concat(summary_tables[domain]).to_csv(out_dir / f"{conf_savename}sc-ghg-dscim-{sector_short}-summary.csv", index = False)
 
-        # Splits and saves collapsed SCGHGs
-        for gas in gases:
-            out_dir = Path(conf['save_path']) / f"{'territorial_us' if terr_us else 'global'}_scghgs"   
+            # Stage timings of every run so far, next to the attribute files
+            get_recorder().write(out_dir / f"{conf_savename}timings-{sector_short}.csv")
+
+        # Saves global consumption no pulse as soon as the runs of the earliest pulse year are done, rather than
+        # keeping it until the end of the sweep
+        # Fewer GCNPs are saved because they vary across fewer dimensions than SCGHGs
+        # A sweep of both domains saves it once, with the attrs of the global SCGHGs
+        if gcnp_cube is not None:
+            with stage("combine", sector = sector_short, pulse_year = pulse_year):
+                # A Dataset, as written before, so that the attributes are global
+                df_full_gcnp = gcnp_cube.to_xarray().to_dataset(name = 'gcnp')
+                df_full_gcnp = df_full_gcnp.assign_coords(gas=[gas_conversion_dict[gas] for gas in df_full_gcnp.gas.values])
+            gcnp_cube = None
+
+            out_dir = Path(conf['save_path']) / 'gcnp' 
             makedir(out_dir)
-            collapsed_gas_scghg = df_full_scghg.sel(gas = gas, drop = True).rename('scghg').to_dataframe().reindex() 
-            print(f"Saving {'territorial U.S.' if terr_us else 'global'} collapsed {sector_short} sc-{gas} \n pulse year: {pulse_year}")
-            collapsed_gas_scghg.to_csv(out_dir / f"{conf_savename}sc-{gas}-dscim-{sector_short}-{pulse_year}.csv") 
-
-        # Creates attribute files 
-        with open(out_dir / f"attributes-{sector_short}.txt", 'w') as f: 
-            for key, value in attrs.items(): 
-                f.write('%s:%s\n' % (key, value))
-    
-    # Saves global consumption no pulse
-    # Fewer GCNPs are saved because they vary across fewer dimensions than SCGHGs
-    if gcnp:
-        out_dir = Path(conf['save_path']) / 'gcnp' 
-        makedir(out_dir)
-        df_full_gcnp.attrs=attrs
-        print(f"Saving {sector_short} global consumption no pulse (gcnp)")
-        df_full_gcnp.to_netcdf(out_dir / f"{conf_savename}gcnp-dscim-{sector_short}.nc4")  
-        print(f"gcnp is available in {str(out_dir)}")
-
-    print(f"{'territorial_us' if terr_us else 'global'}_scghgs are available in {str(Path(conf['save_path']))}/{'territorial_us' if terr_us else 'global'}_scghgs")
+            # Attributes name every pulse year of the sweep, as when gcnp was saved at its end
+            sweep_years = list(dict.fromkeys(pulse_years))
+            gcnp_attrs = dict(attrs[domains[0]], pulse_year = sweep_years if len(sweep_years) > 1 else sweep_years[0])
+            df_full_gcnp.attrs=gcnp_attrs
+            print(f"Saving {sector_short} global consumption no pulse (gcnp)")
+            with stage("write_gcnp", sector = sector_short):
+                if output_format == "csv":
+                    df_full_gcnp.to_netcdf(out_dir / f"{conf_savename}gcnp-dscim-{sector_short}.nc4",
+                                           encoding = {'gcnp': netcdf_encoding(df_full_gcnp.gcnp)})
+                else:
+                    DistributionWriter(out_dir / f"{conf_savename}gcnp-dscim-{sector_short}.{output_format}", output_format).write(df_full_gcnp, attrs = gcnp_attrs)
+            del df_full_gcnp
+            print(f"gcnp is available in {str(out_dir)}")
+
+    for domain in domains:
+        print(f"{domain}_scghgs are available in {str(Path(conf['save_path']))}/{domain}_scghgs")
    
 
-# Command line interface for DSCIM-epa runs        
-f = Figlet(font='slant')
-print(f.renderText('DSCIM-EPA'))
+# Command line interface for DSCIM-epa runs
+# Guarded so that worker processes can import this module without prompting
+if __name__ == "__main__":
+    import inquirer
+    from pyfiglet import Figlet
 
+    coastal_v = str(conf["coastal_version"])
+    mortality_v = str(conf["mortality_version"])
+    CAMEL_v = f"CAMEL_m{mortality_v}_c{coastal_v}"
 
+    f = Figlet(font='slant')
+    print(f.renderText('DSCIM-EPA'))
+
+
+
+    questions = [
+        inquirer.List("sector",
+            message= 'Select sector',
+            choices= [
+                ('Combined',CAMEL_v),
+                ('Coastal',"coastal_v" + coastal_v),
+                ('Agriculture','agriculture'),
+                ('Mortality',"mortality_v" + mortality_v),
+                ('Energy','energy'),
+                ('Labor','labor'),
+            ],
+            default = [CAMEL_v]),
+        inquirer.Checkbox("eta_rhos",
+            message= 'Select discount rates',
+            choices= [
+                (
+                    '1.5% Ramsey',
+                    [1.016010255, 9.149608e-05]
+                ),
+                (
+                    '2.0% Ramsey',
+                    [1.244459066, 0.00197263997]
+                ),
+                (
+                    '2.5% Ramsey',
+                    [1.421158116, 0.00461878399]
+                ),
+        ],
+            default = [[1.016010255, 9.149608e-05],
+                       [1.244459066, 0.00197263997],
+                       [1.421158116, 0.00461878399]]),
+        inquirer.Checkbox("pulse_year",
+            message= 'Select pulse years',
+            choices= [
+                (
+                    '2020',
+                    2020
+                ),
+                (
+                    '2030',
+                    2030
+                ),
+                (
+                    '2040',
+                    2040
+                ),
+                (
+                    '2050',
+                    2050
+                ),
+                (
+                    '2060',
+                    2060
+                ),
+                (
+                    '2070',
+                    2070
+                ),
+                (
+                    '2080',
+                    2080
+                ),
 
-questions = [
-    inquirer.List("sector",
-        message= 'Select sector',
-        choices= [
-            ('Combined',CAMEL_v),
-            ('Coastal',"coastal_v" + coastal_v),
-            ('Agriculture','agriculture'),
-            ('Mortality',"mortality_v" + mortality_v),
-            ('Energy','energy'),
-            ('Labor','labor'),
         ],
-        default = [CAMEL_v]),
-    inquirer.Checkbox("eta_rhos",
-        message= 'Select discount rates',
-        choices= [
-            (
-                '1.5% Ramsey',
-                [1.016010255, 9.149608e-05]
-            ),
-            (
-                '2.0% Ramsey',
-                [1.244459066, 0.00197263997]
-            ),
-            (
-                '2.5% Ramsey',
-                [1.421158116, 0.00461878399]
-            ),
-    ],
-        default = [[1.016010255, 9.149608e-05],
-                   [1.244459066, 0.00197263997],
-                   [1.421158116, 0.00461878399]]),
-    inquirer.Checkbox("pulse_year",
-        message= 'Select pulse years',
-        choices= [
-            (
-                '2020',
-                2020
-            ),
-            (
-                '2030',
-                2030
-            ),
-            (
-                '2040',
-                2040
-            ),
-            (
-                '2050',
-                2050
-            ),
-            (
-                '2060',
-                2060
-            ),
-            (
-                '2070',
-                2070
-            ),
-            (
-                '2080',
-                2080
-            ),
-
-    ],
-        default = [2020,2030,2040,2050,2060,2070,2080]),
-    inquirer.List("U.S.",
-        message= 'Select valuation type',
-        choices= [
-            ('Global',False),
-            ('Territorial U.S.',True)
-        ]),
-    inquirer.Checkbox("files",
-        message= 'Optional files to save (will increase runtime substantially)',
-        choices= [
-            (
-                'Global consumption no pulse',
-                'gcnp'
-            ),
-            (
-                'Uncollapsed scghgs',
-                'uncollapsed'
-            ),
-    ])
+            default = [2020,2030,2040,2050,2060,2070,2080]),
+        inquirer.List("U.S.",
+            message= 'Select valuation type',
+            choices= [
+                ('Global',False),
+                ('Territorial U.S.',True),
+                ('Global and territorial U.S.','both')
+            ]),
+        inquirer.Checkbox("files",
+            message= 'Optional files to save (will increase runtime substantially)',
+            choices= [
+                (
+                    'Global consumption no pulse',
+                    'gcnp'
+                ),
+                (
+                    'Uncollapsed scghgs',
+                    'uncollapsed'
+                ),
+                (
+                    'Distribution summaries (quantiles and moments of uncollapsed scghgs)',
+                    'summary'
+                ),
+        ])
         
-]
-
-answers = inquirer.prompt(questions)
-etas_rhos = answers['eta_rhos']
-sector = [answers['sector']]
-pulse_years = answers['pulse_year']
-terr_us = answers['U.S.']
-gcnp = True if 'gcnp' in answers['files'] else False
-uncollapsed = True if 'uncollapsed' in answers['files'] else False
-
-if terr_us:
-    sector = [i + "_USA" for i in sector]
-
-if len(etas_rhos) == 0:
-    raise ValueError('You must select at least one eta, rho combination')
-
-risk_combos = [['risk_aversion', 'euler_ramsey']] # Default
-gases = ['CO2_Fossil', 'CH4', 'N2O'] # Default
-epa_scghgs(sector,
-         terr_us,
-         etas_rhos,
-         risk_combos,
-         pulse_years=pulse_years,
-         gcnp = gcnp,
-         uncollapsed = uncollapsed)
-
-
-print(f"Full results are available in {str(Path(conf['save_path']))}")
+    ]
+
+    answers = inquirer.prompt(questions)
+    etas_rhos = answers['eta_rhos']
+    sector = [answers['sector']]
+    pulse_years = answers['pulse_year']
+    # Both domains are computed together, sharing the global discount factors, gcnp and adjustment factors
+    both_domains = answers['U.S.'] == 'both'
+    terr_us = answers['U.S.'] is True
+    gcnp = True if 'gcnp' in answers['files'] else False
+    uncollapsed = True if 'uncollapsed' in answers['files'] else False
+    summary_quantiles = conf.get("summary_quantiles", DEFAULT_SUMMARY_QUANTILES) if 'summary' in answers['files'] else None
+
+    if terr_us:
+        sector = [i + "_USA" for i in sector]
+
+    if len(etas_rhos) == 0:
+        raise ValueError('You must select at least one eta, rho combination')
+
+    risk_combos = [['risk_aversion', 'euler_ramsey']] # Default
+    gases = ['CO2_Fossil', 'CH4', 'N2O'] # Default
+
+    # Runs are spread across local processes or a dask cluster if requested in the config.
+    # The input cache cap is shared between the workers, each of which holds its own cache
+    executor_settings = dict(backend = conf.get("executor", "serial"),
+                             max_workers = conf.get("executor_workers"),
+                             address = conf.get("dask_scheduler_address"))
+    with get_executor(**executor_settings,
+                      initializer = configure_input_cache,
+                      initargs = (input_cache_bytes // worker_count(**executor_settings),)) as executor:
+        # Completed runs are saved and reused across sweeps if a store is configured
+        result_store = ResultStore(conf["result_store_path"]) if conf.get("result_store_path") else None
+        epa_scghgs(sector,
+                 terr_us,
+                 etas_rhos,
+                 risk_combos,
+                 pulse_years=pulse_years,
+                 gcnp = gcnp,
+                 uncollapsed = uncollapsed,
+                 executor = executor,
+                 result_store = result_store,
+                 batch_discount_rates = conf.get("batch_discount_rates", False),
+                 runid_chunk_size = conf.get("runid_chunk_size"),
+                 output_format = conf.get("output_format", "csv"),
+                 both_domains = both_domains,
+                 progressive_tolerance = conf.get("progressive_tolerance"),
+                 progressive_seed = conf.get("progressive_seed", 0),
+                 summary_quantiles = summary_quantiles)
+
+    if conf.get("timing_summary", False):
+        print(get_recorder().summary())
+
+    print(f"Full results are available in {str(Path(conf['save_path']))}")
 
@@ -0,0 +1,72 @@
+"""Compare the netCDF outputs of two SCGHG runs, e.g. of two versions of this repository.
+
+Every ``.nc4`` file under the reference output directory, such as the global consumption
+no pulse, must also be saved by the other run, with the same global attributes, variables
+and dimensions, and values equal up to ``--rtol``. Attributes that identify the run
+rather than its outputs, such as the commit, are not compared. The exit status is 1 if
+any differ::
+
+    python scripts/compare_outputs.py <reference save_path> <save_path>
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+
+# Attributes that differ between runs of the same version, or between versions
+RUN_ATTRS = ["Date Created", "machine", "commit", "url"]
+
+
+def compare_netcdf(reference_path, path, rtol=1e-12):
+    """Differences between the netCDF files at ``reference_path`` and ``path``, as a list
+    of messages. Empty if the files are the same.
+    """
+    if not path.exists():
+        return ["missing"]
+
+    differences = []
+    with xr.open_dataset(reference_path) as reference, xr.open_dataset(path) as ds:
+        if reference.attrs.keys() != ds.attrs.keys():
+            differences.append(
+                f"global attributes {sorted(reference.attrs)} != {sorted(ds.attrs)}"
+            )
+        else:
+            differences += [
+                f"global attribute '{k}' {reference.attrs[k]!r} != {ds.attrs[k]!r}"
+                for k in reference.attrs
+                if k not in RUN_ATTRS
+                and not np.array_equal(reference.attrs[k], ds.attrs[k])
+            ]
+
+        if set(reference.data_vars) != set(ds.data_vars):
+            differences.append(f"variables {sorted(reference.data_vars)} != {sorted(ds.data_vars)}")
+        for name in set(reference.data_vars) & set(ds.data_vars):
+            ref_var, var = reference[name], ds[name]
+            if ref_var.dims != var.dims:
+                differences.append(f"'{name}' dims {ref_var.dims} != {var.dims}")
+                continue
+            var = var.reindex_like(ref_var)
+            if not np.allclose(var.values, ref_var.values, rtol=rtol, atol=0, equal_nan=True):
+                differences.append(f"'{name}' values differ")
+    return differences
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the netCDF outputs of two SCGHG runs.")
+    parser.add_argument("reference", help="save_path of the reference run")
+    parser.add_argument("outputs", help="save_path of the run to check")
+    parser.add_argument("--rtol", type=float, default=1e-12, help="relative tolerance of values")
+    args = parser.parse_args()
+
+    reference_dir, output_dir = Path(args.reference), Path(args.outputs)
+    failed = False
+    for reference_path in sorted(reference_dir.rglob("*.nc4")):
+        name = reference_path.relative_to(reference_dir)
+        differences = compare_netcdf(reference_path, output_dir / name, rtol=args.rtol)
+        print(f"{name}: {'identical' if not differences else 'DIFFERENT'}")
+        for difference in differences:
+            print(f"  {difference}")
+        failed = failed or bool(differences)
+    sys.exit(1 if failed else 0)
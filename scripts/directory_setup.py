@@ -1,73 +1,89 @@
+import argparse
 import yaml
 import os
 from pathlib import Path
-import zipfile
-from tqdm import *
-import requests
+from input_download import ArchiveDownload
+from prepare_inputs import DEFAULT_RUNID_CHUNK, prepare_inputs
 
-base = os.getcwd()
-input = Path(base) / "input"  
-output = Path(base) / "output"  
+INPUTS_URL = 'https://storage.googleapis.com/climateimpactlab-scc-tool/dscim-epa_input_data/dscim_v20221021_inputs.zip'
 
 def makedir(path):
     if not os.path.exists(path):
         os.makedirs(path)
         
     
-climate_inputs = input / "climate"
-econ_inputs = input / "econ"
-damage_functions = input / "damage_functions"
+# Config for inputs laid out under `input` and outputs saved to `output`
+def make_conf(input, output):
+    climate_inputs = input / "climate"
+    econ_inputs = input / "econ"
+    damage_functions = input / "damage_functions"
 
-
-conf_base = {'mortality_version': 1,
- 'coastal_version': '0.20',
- 'rff_climate': {'gases': ['CO2_Fossil', 'CH4', 'N2O'],
-  'gmsl_path': '',
-  'gmst_path': '',
-  'gmst_fair_path': str(climate_inputs / 'gmst_pulse.nc'),
-  'gmsl_fair_path': str(climate_inputs / 'gmsl_pulse.zarr'),
-  'damages_pulse_conversion_path': str(climate_inputs / 'conversion_v5.03_Feb072022.nc4'),
-  'ecs_mask_path': None,
-  'emission_scenarios': None},
- 'paths': {'rff_damage_function_library': str(damage_functions)},
- 'rffdata': {'socioec_output': str(econ_inputs),
-  'pulse_years': [2020, 2030, 2040, 2050, 2060, 2070, 2080]},
- 'sectors': {'coastal_v0.20': {'formula': 'damages ~ -1 + gmsl + np.power(gmsl, 2)'},
-  'agriculture': {'formula': 'damages ~ -1 + anomaly + np.power(anomaly, 2)'},
-  'mortality_v1': {'formula': 'damages ~ -1 + anomaly + np.power(anomaly, 2)'},
-  'energy': {'formula': 'damages ~ -1 + anomaly + np.power(anomaly, 2)'},
-  'labor': {'formula': 'damages ~ -1 + anomaly + np.power(anomaly, 2)'},
-  'AMEL_m1': {'formula': 'damages ~ -1 + anomaly + np.power(anomaly, 2)'},
-  'CAMEL_m1_c0.20': {'formula': 'damages ~ -1 + anomaly + np.power(anomaly, 2) + gmsl + np.power(gmsl, 2)'}},
-  'save_path': str(output)}
+    return {'mortality_version': 1,
+     'coastal_version': '0.20',
+     'rff_climate': {'gases': ['CO2_Fossil', 'CH4', 'N2O'],
+      'gmsl_path': '',
+      'gmst_path': '',
+      'gmst_fair_path': str(climate_inputs / 'gmst_pulse.nc'),
+      'gmsl_fair_path': str(climate_inputs / 'gmsl_pulse.zarr'),
+      'damages_pulse_conversion_path': str(climate_inputs / 'conversion_v5.03_Feb072022.nc4'),
+      'ecs_mask_path': None,
+      'emission_scenarios': None},
+     'paths': {'rff_damage_function_library': str(damage_functions)},
+     'rffdata': {'socioec_output': str(econ_inputs),
+      'pulse_years': [2020, 2030, 2040, 2050, 2060, 2070, 2080]},
+     'sectors': {'coastal_v0.20': {'formula': 'damages ~ -1 + gmsl + np.power(gmsl, 2)'},
+      'agriculture': {'formula': 'damages ~ -1 + anomaly + np.power(anomaly, 2)'},
+      'mortality_v1': {'formula': 'damages ~ -1 + anomaly + np.power(anomaly, 2)'},
+      'energy': {'formula': 'damages ~ -1 + anomaly + np.power(anomaly, 2)'},
+      'labor': {'formula': 'damages ~ -1 + anomaly + np.power(anomaly, 2)'},
+      'AMEL_m1': {'formula': 'damages ~ -1 + anomaly + np.power(anomaly, 2)'},
+      'CAMEL_m1_c0.20': {'formula': 'damages ~ -1 + anomaly + np.power(anomaly, 2) + gmsl + np.power(gmsl, 2)'}},
+      'save_path': str(output)}
   
-# Download inputs from internet  
-print("Downloading input files...")
-name = 'dscim_v20221021_inputs.zip'
-url = 'https://storage.googleapis.com/climateimpactlab-scc-tool/dscim-epa_input_data/' + name
-with requests.get(url, stream = True) as r:
-    r.raise_for_status()
-    with open(name, 'wb') as f:
-        pbar = tqdm(total = int(r.headers['Content-Length']))
-        for chunk in r.iter_content(chunk_size=8192):
-            if chunk:  # filter out keep-alive new chunks
-                f.write(chunk)
-                pbar.update(len(chunk))
-print("")
-print("Unzipping input files...")
-with zipfile.ZipFile(Path(base) /  name, 'r') as zip_ref:
-    for member in tqdm(zip_ref.infolist()):
-        try:
-            zip_ref.extract(member, Path(base))
-        except zipfile.error as e:
-            pass
+# Damage functions of global and territorial U.S. runs of the sectors in the config, and all other inputs
+def selected_member(member, sectors):
+    parts = Path(member).parts
+    if len(parts) > 2 and parts[1] == "damage_functions":
+        return parts[2] in sectors or parts[2] in [s + "_USA" for s in sectors]
+    return True
+
+# Guarded so that the config layout can be imported, e.g. to generate synthetic inputs
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download input data and generate the config.")
+    parser.add_argument("--sectors", nargs="+", default=None,
+                        help="only download damage functions of these sectors (default: all sectors)")
+    parser.add_argument("--connections", type=int, default=8, help="number of concurrent downloads")
+    parser.add_argument("--extract-workers", type=int, default=8, help="number of threads extracting files")
+    parser.add_argument("--prepare-inputs", action="store_true",
+                        help="rewrite climate and socioeconomic inputs into chunked Zarr stores after downloading")
+    parser.add_argument("--runid-chunk", type=int, default=DEFAULT_RUNID_CHUNK,
+                        help="number of RFF-SP draws per chunk of the prepared inputs")
+    parser.add_argument("--url", default=INPUTS_URL, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    base = os.getcwd()
+    input = Path(base) / "input"  
+    output = Path(base) / "output"  
+    conf_base = make_conf(input, output)
+    if args.sectors is not None:
+        conf_base['sectors'] = {k: v for k, v in conf_base['sectors'].items() if k in args.sectors}
+
+    # Download inputs from internet  
+    print("Downloading input files...")
+    names = ArchiveDownload(
+        args.url,
+        Path(base),
+        select = lambda member: selected_member(member, conf_base['sectors']),
+        connections = args.connections,
+        extract_workers = args.extract_workers,
+    ).run()
+    print(f"{len(names)} input files downloaded")
 
-if os.path.exists(Path(base) / name):
-    os.remove(Path(base) / name)
-else:
-    print("Download Failed")
+    os.rename(Path(base) / 'inputs', input)
 
-os.rename(Path(base) / 'inputs', input)
+    if args.prepare_inputs:
+        print("Preparing input files...")
+        conf_base = prepare_inputs(conf_base, input / 'prepared', runid_chunk = args.runid_chunk)
 
-with open('generated_conf.yml', 'w') as outfile:
-    yaml.dump(conf_base, outfile, default_flow_style=False)
+    with open('generated_conf.yml', 'w') as outfile:
+        yaml.dump(conf_base, outfile, default_flow_style=False)
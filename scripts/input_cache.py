@@ -0,0 +1,291 @@
+"""In-memory cache for the climate and socioeconomic inputs shared by SCGHG runs.
+
+Every ``epa_scghg`` call in an ``epa_scghgs`` sweep reads the same FaIR GMST/GMSL
+anomalies, emissions conversion factors and RFF socioeconomics, and the runs of each
+discount rate the same damage function coefficients. ``InputCache`` keeps
+those arrays loaded, keyed by file path (and pulse year where the array depends on it),
+and evicts the least recently used entries once a memory cap is exceeded. Of the
+climate inputs, only the anomalies of each pulse year are loaded, from lazily opened
+files.
+
+Inputs rewritten by ``prepare_inputs.py`` are read lazily, so that a run loads only the
+chunks of its own pulse year and gases.
+"""
+import copy
+import os
+from collections import OrderedDict
+
+import xarray as xr
+import yaml
+from dscim.menu.simple_storage import Climate, EconVars
+from prepare_inputs import is_prepared
+
+# Default memory cap for a single process
+DEFAULT_MAX_BYTES = 16 * 1024**3
+
+
+def _nbytes(obj):
+    """Approximate in-memory size of a cached value."""
+    if isinstance(obj, (xr.DataArray, xr.Dataset)):
+        return obj.nbytes
+    return 0
+
+
+def _file_key(path):
+    """Key a file by its path and modification time so edited inputs are reloaded."""
+    path = str(path)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    return (path, mtime)
+
+
+def _select_runids(obj, runids):
+    """Subset a cached array to ``runids``, if given and if it has a runid dimension."""
+    if runids is not None and "runid" in obj.dims:
+        return obj.sel(runid=runids)
+    return obj
+
+
+def _uncached(cls, name):
+    """The function computing property ``name`` of ``cls``, which dscim defines as
+    either a ``property`` or a ``cachedproperty``.
+    """
+    attr = getattr(cls, name)
+    return attr.fget if isinstance(attr, property) else attr.__func__
+
+
+def _freeze(value):
+    """Make list-valued config entries (e.g. ``gases``) hashable."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class InputCache:
+    """Least-recently-used cache of loaded input arrays with a memory cap.
+
+    Parameters
+    ----------
+    max_bytes : int or None, optional
+        Total size of cached arrays above which the least recently used entries are
+        evicted. Values larger than the cap on their own are returned but not cached.
+        If None, nothing is evicted.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def total_bytes(self):
+        return sum(self._sizes.values())
+
+    def get(self, key, loader):
+        """Return the value cached under ``key``, calling ``loader()`` on a miss."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+        self.misses += 1
+        value = loader()
+        size = _nbytes(value)
+        if self.max_bytes is None or size <= self.max_bytes:
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._evict()
+        return value
+
+    def _evict(self):
+        while self.max_bytes is not None and self.total_bytes > self.max_bytes:
+            key, _ = self._entries.popitem(last=False)
+            del self._sizes[key]
+
+    def clear(self):
+        self._entries.clear()
+        self._sizes.clear()
+
+    def read_yaml(self, path):
+        """Read a YAML config. A copy is returned so callers may modify it."""
+        conf = self.get(("yaml",) + _file_key(path), lambda: _read_yaml(path))
+        return copy.deepcopy(conf)
+
+    def econ_vars(self, path_econ, runids=None):
+        return CachedEconVars(path_econ=path_econ, input_cache=self, runids=runids)
+
+    def climate(self, pulse_year, runids=None, **climate_kwargs):
+        return CachedClimate(
+            pulse_year=pulse_year, input_cache=self, runids=runids, **climate_kwargs
+        )
+
+    def population(self, path_econ):
+        """World population from an RFF socioeconomics file."""
+
+        def load():
+            with xr.open_dataset(path_econ) as ds:
+                return ds.sel(region="world", drop=True).pop.load()
+
+        return self.get(("population",) + _file_key(path_econ), load)
+
+    def dataset(self, path):
+        """A netCDF file, such as a file of damage function coefficients, loaded into memory."""
+
+        def load():
+            with xr.open_dataset(path) as ds:
+                return ds.load()
+
+        return self.get(("dataset",) + _file_key(path), load)
+
+    def derived(self, key, paths, compute):
+        """An array computed from inputs, such as global consumption no pulse, cached
+        under ``key`` and the modification times of the files ``paths`` it is computed
+        from, so that it is recomputed once any of them is edited.
+        """
+        return self.get(("derived",) + tuple(key) + tuple(_file_key(p) for p in paths), compute)
+
+    def runids(self, path_econ):
+        """All RFF-SP draws in an RFF socioeconomics file."""
+        return self.population(path_econ).runid.values
+
+
+def _read_yaml(path):
+    with open(path, "r") as stream:
+        return yaml.safe_load(stream)
+
+
+class CachedEconVars(EconVars):
+    """``EconVars`` that serves its socioeconomic arrays from an ``InputCache``.
+
+    If ``runids`` is given, only those RFF-SP draws are returned. The full arrays are
+    still cached, so that other subsets are served without rereading the file.
+    """
+
+    def __init__(self, path_econ, input_cache, runids=None):
+        super().__init__(path_econ=path_econ)
+        self.input_cache = input_cache
+        self.runids = runids
+
+    @property
+    def econ_vars(self):
+        econ_vars = self.input_cache.get(
+            ("econ_vars",) + _file_key(self.path),
+            lambda: _uncached(EconVars, "econ_vars")(self).load(),
+        )
+        return _select_runids(econ_vars, self.runids)
+
+
+class CachedClimate(Climate):
+    """``Climate`` that serves its FaIR anomalies and conversion factors from an
+    ``InputCache``, keyed by the input paths and the pulse year.
+
+    If ``runids`` is given, only those RFF-SP draws are returned.
+    """
+
+    def __init__(self, input_cache, runids=None, **kwargs):
+        super().__init__(**kwargs)
+        self.input_cache = input_cache
+        self.runids = runids
+
+    def _key(self, name, *paths, by_pulse_year=True):
+        pulse_year = self.pulse_year if by_pulse_year else None
+        key = (name, pulse_year, _freeze(self.gases), _freeze(self.base_period))
+        for path in paths:
+            key += _file_key(path) if path else (None,)
+        return key
+
+    def _cached(self, name, *paths, by_pulse_year=True):
+        def load():
+            # Load the full arrays regardless of the runid subset of this instance
+            runids, self.runids = self.runids, None
+            try:
+                return _uncached(Climate, name)(self).load()
+            finally:
+                self.runids = runids
+
+        value = self.input_cache.get(self._key(name, *paths, by_pulse_year=by_pulse_year), load)
+        return _select_runids(value, self.runids)
+
+    def _open_prepared(self, path):
+        """Lazily open the pulse year and gases of this run in a prepared store."""
+        ds = xr.open_zarr(path, consolidated=True)
+        if "pulse_year" in ds.dims:
+            ds = ds.sel(pulse_year=self.pulse_year, drop=True)
+        return ds.sel(gas=self.gases)
+
+    def _prepared_gmst_anomalies(self):
+        """``Climate.gmst_anomalies``, reading only this run's chunks."""
+        temps = self._open_prepared(self.gmst_fair_path)
+        base_period = temps.sel(year=slice(self.base_period[0], self.base_period[1])).mean(dim="year")
+        return temps.sel(year=slice(self.pulse_year, 2300)) - base_period
+
+    def _prepared_gmsl_anomalies(self):
+        """``Climate.gmsl_anomalies``, reading only this run's chunks."""
+        df = self._open_prepared(self.gmsl_fair_path)
+        datasets = []
+        for var in df.keys():
+            ds = df[var].to_dataset(dim="runtype")
+            datasets.append(ds.rename({k: f"{k}_{var}" for k in ds.keys()}))
+        anomaly = xr.merge(datasets, combine_attrs="override").drop_vars(
+            ["confidence", "kind", "locations", "workflow_src"], errors="ignore"
+        )
+        if "pulse_gmsl_median" in anomaly.keys() and "control_gmsl_median" in anomaly.keys():
+            anomaly = anomaly.rename(
+                {
+                    "pulse_gmsl_median": "medianparams_pulse_gmsl",
+                    "control_gmsl_median": "medianparams_control_gmsl",
+                }
+            )
+        return anomaly
+
+    # GMST and GMSL anomalies are opened lazily and not cached, so that only the pulse
+    # year and years of ``anomalies`` are loaded
+    @property
+    def gmst_anomalies(self):
+        if is_prepared(self.gmst_fair_path):
+            return self._prepared_gmst_anomalies()
+        return _uncached(Climate, "gmst_anomalies")(self)
+
+    @property
+    def gmsl_anomalies(self):
+        if is_prepared(self.gmsl_fair_path):
+            return self._prepared_gmsl_anomalies()
+        return _uncached(Climate, "gmsl_anomalies")(self)
+
+    @property
+    def anomalies(self):
+        return self._cached("anomalies", self.gmst_fair_path, self.gmsl_fair_path)
+
+    @property
+    def conversion(self):
+        # Conversion factors do not depend on the pulse year, so are shared by every run
+        return self._cached("conversion", self.damages_pulse_conversion_path, by_pulse_year=False)
+
+
+# Cache shared by every run in this process. Each worker process of a parallel sweep
+# holds its own.
+_process_cache = None
+
+
+def configure_input_cache(max_bytes=DEFAULT_MAX_BYTES):
+    """Create this process's shared ``InputCache`` with the given memory cap."""
+    global _process_cache
+    _process_cache = InputCache(max_bytes=max_bytes)
+    return _process_cache
+
+
+def get_input_cache():
+    """Return this process's shared ``InputCache``, creating it on first use."""
+    if _process_cache is None:
+        configure_input_cache()
+    return _process_cache
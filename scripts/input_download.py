@@ -0,0 +1,249 @@
+"""Parallel, resumable download and extraction of zipped input data.
+
+The zip archive is read over HTTP range requests: its central directory is fetched
+first, then only the byte ranges of the members that are wanted are downloaded, split
+into blocks fetched by several connections at once. Blocks are written into a sparse
+local copy of the archive (``<name>.part``) and recorded as they complete
+(``<name>.part.json``), so an interrupted download resumes where it stopped. Members are
+then extracted by a pool of threads. Python's ``zipfile`` checks the CRC-32 of every
+member as it is extracted; a member that fails the check is downloaded and extracted
+once more before giving up.
+
+If the server does not support range requests, the whole archive is downloaded over a
+single connection instead.
+"""
+import json
+import os
+import threading
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import requests
+from tqdm import tqdm
+
+BLOCK_SIZE = 32 * 1024**2
+
+
+class RemoteFile:
+    """Read-only, seekable file over HTTP range requests.
+
+    Every range read is also written to the same offset of the open file descriptor
+    ``local_fd``, so the parts of the archive ``zipfile`` reads (its central directory)
+    end up in the local copy.
+    """
+
+    def __init__(self, session, url, size, local_fd):
+        self.session = session
+        self.url = url
+        self.size = size
+        self.local_fd = local_fd
+        self.pos = 0
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            self.pos = offset
+        elif whence == os.SEEK_CUR:
+            self.pos += offset
+        else:
+            self.pos = self.size + offset
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def read(self, n=-1):
+        end = self.size if n is None or n < 0 else min(self.pos + n, self.size)
+        if end <= self.pos:
+            return b""
+        data = fetch_range(self.session, self.url, self.pos, end)
+        os.pwrite(self.local_fd, data, self.pos)
+        self.pos = end
+        return data
+
+
+def fetch_range(session, url, start, end):
+    """Bytes ``[start, end)`` of ``url``."""
+    r = session.get(url, headers={"Range": f"bytes={start}-{end - 1}"}, timeout=60)
+    r.raise_for_status()
+    if r.status_code != 206 or len(r.content) != end - start:
+        raise IOError(f"Server returned an unexpected response to a range request for {url}")
+    return r.content
+
+
+def member_ranges(archive):
+    """Byte range of each member of an open ``zipfile.ZipFile``, including its local
+    header, as ``{name: (start, end)}``.
+    """
+    infos = sorted(archive.infolist(), key=lambda info: info.header_offset)
+    ends = [info.header_offset for info in infos[1:]] + [archive.start_dir]
+    return {info.filename: (info.header_offset, end) for info, end in zip(infos, ends)}
+
+
+def blocks(ranges, block_size=None):
+    """Split byte ranges into blocks of at most ``block_size`` bytes (default
+    ``BLOCK_SIZE``).
+    """
+    block_size = block_size or BLOCK_SIZE
+    out = []
+    for start, end in sorted(set(ranges)):
+        for block_start in range(start, end, block_size):
+            out.append((block_start, min(block_start + block_size, end)))
+    return out
+
+
+class ArchiveDownload:
+    """Download the members of the remote zip archive at ``url`` into ``dest``.
+
+    Parameters
+    ----------
+    url : str
+    dest : str or :class:`pathlib.Path`
+        Directory to extract members to.
+    select : callable or None, optional
+        Called with each member name; only members for which it returns True are
+        downloaded and extracted. Defaults to every member.
+    connections : int, optional
+        Number of concurrent range requests.
+    extract_workers : int, optional
+        Number of threads extracting members.
+    part_path : str or :class:`pathlib.Path` or None, optional
+        Local copy of the archive. Defaults to the archive name in the working
+        directory, plus ``.part``. Removed once every member is extracted.
+    """
+
+    def __init__(self, url, dest, select=None, connections=8, extract_workers=8, part_path=None):
+        self.url = url
+        self.dest = Path(dest)
+        self.select = select or (lambda name: True)
+        self.connections = connections
+        self.extract_workers = extract_workers
+        self.part_path = Path(part_path or url.rsplit("/", 1)[-1] + ".part")
+        self.state_path = Path(str(self.part_path) + ".json")
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=connections)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.lock = threading.Lock()
+        self.done = set()
+
+    def run(self):
+        """Download and extract the selected members. Returns their names."""
+        head = self.session.head(self.url, allow_redirects=True, timeout=60)
+        head.raise_for_status()
+        size = int(head.headers["Content-Length"])
+        version = head.headers.get("ETag") or head.headers.get("Last-Modified")
+
+        if head.headers.get("Accept-Ranges") != "bytes":
+            print("Server does not support range requests, downloading the whole archive...")
+            self._download_whole()
+            with zipfile.ZipFile(self.part_path) as archive:
+                names = [n for n in archive.namelist() if self.select(n)]
+        else:
+            self._load_state(size, version)
+            fd = os.open(self.part_path, os.O_RDWR | os.O_CREAT)
+            try:
+                os.ftruncate(fd, size)
+                with zipfile.ZipFile(RemoteFile(self.session, self.url, size, fd)) as archive:
+                    ranges = member_ranges(archive)
+                names = [n for n in ranges if self.select(n)]
+                self._download_blocks(fd, blocks(ranges[n] for n in names))
+            finally:
+                os.close(fd)
+
+        print("Extracting input files...")
+        failed = self._extract(names)
+        if failed and self.state_path.exists():
+            # Members whose CRC check failed are downloaded and extracted once more
+            print(f"Downloading {len(failed)} corrupted input files again...")
+            with zipfile.ZipFile(self.part_path) as archive:
+                ranges = member_ranges(archive)
+            fd = os.open(self.part_path, os.O_RDWR)
+            try:
+                redo = blocks(ranges[n] for n in failed)
+                self.done.difference_update(redo)
+                self._download_blocks(fd, redo)
+            finally:
+                os.close(fd)
+            failed = self._extract(failed)
+        if failed:
+            raise zipfile.BadZipFile(f"Input files failed their checksum: {', '.join(failed)}")
+
+        self.part_path.unlink()
+        if self.state_path.exists():
+            self.state_path.unlink()
+        return names
+
+    def _load_state(self, size, version):
+        """Blocks already downloaded into the local copy, if it is of the same archive."""
+        self.done = set()
+        if self.part_path.exists() and self.state_path.exists():
+            with open(self.state_path) as f:
+                state = json.load(f)
+            if state["url"] == self.url and state["size"] == size and state["version"] == version:
+                self.done = {tuple(block) for block in state["done"]}
+        if not self.done and self.part_path.exists():
+            self.part_path.unlink()
+        self.state = {"url": self.url, "size": size, "version": version}
+
+    def _save_state(self):
+        tmp = Path(str(self.state_path) + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(dict(self.state, done=sorted(self.done)), f)
+        os.replace(tmp, self.state_path)
+
+    def _download_blocks(self, fd, todo):
+        todo = [block for block in todo if block not in self.done]
+        if len(self.done):
+            print(f"Resuming download, {len(self.done)} blocks already downloaded")
+        pbar = tqdm(total=sum(end - start for start, end in todo), unit="B", unit_scale=True)
+
+        def download(block):
+            start, end = block
+            os.pwrite(fd, fetch_range(self.session, self.url, start, end), start)
+            with self.lock:
+                self.done.add(block)
+                self._save_state()
+                pbar.update(end - start)
+
+        with ThreadPoolExecutor(self.connections) as pool:
+            for future in as_completed([pool.submit(download, block) for block in todo]):
+                future.result()
+        pbar.close()
+
+    def _download_whole(self):
+        with self.session.get(self.url, stream=True, timeout=60) as r:
+            r.raise_for_status()
+            with open(self.part_path, "wb") as f:
+                pbar = tqdm(total=int(r.headers["Content-Length"]), unit="B", unit_scale=True)
+                for chunk in r.iter_content(chunk_size=BLOCK_SIZE):
+                    f.write(chunk)
+                    pbar.update(len(chunk))
+                pbar.close()
+
+    def _extract(self, names):
+        """Extract ``names`` in parallel. Returns the names that failed their CRC check."""
+        local = threading.local()
+        archives = []
+
+        def extract(name):
+            # Each thread reads through its own zipfile handle
+            if not hasattr(local, "archive"):
+                local.archive = zipfile.ZipFile(self.part_path)
+                archives.append(local.archive)
+            try:
+                local.archive.extract(name, self.dest)
+            except (zipfile.BadZipFile, zlib.error):
+                return name
+
+        try:
+            with ThreadPoolExecutor(self.extract_workers) as pool:
+                results = list(tqdm(pool.map(extract, names), total=len(names)))
+        finally:
+            for archive in archives:
+                archive.close()
+        return [name for name in results if name is not None]
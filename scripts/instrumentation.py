@@ -0,0 +1,149 @@
+"""Per-stage timing and peak memory of SCGHG runs.
+
+Code wrapped in ``with stage("name"):`` records the wall time, CPU time and peak
+resident memory of that stage, labelled with the parameters of the enclosing
+``with run_labels(...)`` block. Records are kept by this process's recorder. Executors
+that run SCGHG runs in other processes use ``collect`` to bring them back.
+"""
+import csv
+import json
+import resource
+import sys
+import time
+from contextlib import contextmanager
+
+FIELDS = ["stage", "wall_s", "cpu_s", "peak_rss_mb"]
+
+
+def _reset_peak_rss():
+    """Reset the peak RSS of this process (Linux only). Returns whether it worked."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb():
+    """Peak RSS of this process since the last reset, or since it started if resetting
+    is not supported.
+    """
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kB elsewhere
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+class StageRecorder:
+    """Collects one record per stage of every run in this process."""
+
+    def __init__(self):
+        self.records = []
+        self.labels = {}
+
+    @contextmanager
+    def run_labels(self, **labels):
+        outer = self.labels
+        self.labels = {**outer, **labels}
+        try:
+            yield
+        finally:
+            self.labels = outer
+
+    @contextmanager
+    def stage(self, name, **labels):
+        # Stages should not be nested, since each resets the peak RSS
+        _reset_peak_rss()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            self.records.append(
+                {
+                    **self.labels,
+                    **labels,
+                    "stage": name,
+                    "wall_s": time.perf_counter() - wall,
+                    "cpu_s": time.process_time() - cpu,
+                    "peak_rss_mb": _peak_rss_mb(),
+                }
+            )
+
+    def write(self, path):
+        """Write all records to ``path`` as JSON or, if it ends in ``.csv``, CSV."""
+        path = str(path)
+        if path.endswith(".csv"):
+            fields = []
+            for record in self.records:
+                fields += [k for k in record if k not in fields]
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(self.records)
+        else:
+            with open(path, "w") as f:
+                json.dump(self.records, f, indent=1, default=str)
+
+    def totals(self):
+        """Number of runs, total wall and CPU time and maximum peak RSS of each stage."""
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(
+                record["stage"], {"runs": 0, "wall_s": 0, "cpu_s": 0, "peak_rss_mb": 0}
+            )
+            total["runs"] += 1
+            total["wall_s"] += record["wall_s"]
+            total["cpu_s"] += record["cpu_s"]
+            total["peak_rss_mb"] = max(total["peak_rss_mb"], record["peak_rss_mb"])
+        return totals
+
+    def summary(self):
+        """``totals`` as a printable table."""
+        totals = self.totals()
+        lines = [f"{'stage':<28}{'runs':>6}{'wall_s':>12}{'cpu_s':>12}{'peak_rss_mb':>14}"]
+        for name, total in totals.items():
+            lines.append(
+                f"{name:<28}{total['runs']:>6}{total['wall_s']:>12.2f}"
+                f"{total['cpu_s']:>12.2f}{total['peak_rss_mb']:>14.1f}"
+            )
+        return "\n".join(lines)
+
+
+_recorder = StageRecorder()
+
+
+def get_recorder():
+    """Return this process's ``StageRecorder``."""
+    return _recorder
+
+
+def stage(name, **labels):
+    return _recorder.stage(name, **labels)
+
+
+def run_labels(**labels):
+    return _recorder.run_labels(**labels)
+
+
+def collect(fn, **kwargs):
+    """Call ``fn(**kwargs)`` and return its result with the stage records it made.
+
+    Used to run SCGHG runs in worker processes, whose records would otherwise stay in
+    the worker.
+    """
+    global _recorder
+    outer = _recorder
+    _recorder = StageRecorder()
+    try:
+        result = fn(**kwargs)
+        return result, _recorder.records
+    finally:
+        _recorder = outer
@@ -0,0 +1,136 @@
+"""Rewrite the climate and socioeconomic inputs into chunked, consolidated Zarr stores.
+
+The downloaded FaIR GMST anomalies (netCDF), GMSL anomalies (Zarr, unchunked), pulse
+conversion factors and RFF socioeconomics (netCDF) are read whole by every run, although
+a run needs the anomalies of only one pulse year. This step copies them, unchanged, into
+Zarr stores under ``input/prepared`` with consolidated metadata, chunked by pulse year,
+gas and RFF-SP draw, and points the config at the copies. Runs then read lazily only the
+chunks of their own pulse year and gases (see ``CachedClimate`` in ``input_cache.py``).
+
+Usage, after ``directory_setup.py``::
+
+    python scripts/prepare_inputs.py generated_conf.yml
+
+or ``python scripts/directory_setup.py --prepare-inputs`` to download and prepare at once.
+"""
+import argparse
+import os
+import shutil
+from pathlib import Path
+
+import xarray as xr
+import yaml
+
+# Layout version, saved as an attribute of every prepared store
+LAYOUT_ATTR = "dscim_epa_prepared_layout"
+LAYOUT_VERSION = 1
+
+# Default number of RFF-SP draws per chunk
+DEFAULT_RUNID_CHUNK = 2500
+
+CLIMATE_KEYS = ["gmst_fair_path", "gmsl_fair_path", "damages_pulse_conversion_path"]
+
+
+def is_prepared(path):
+    """Whether ``path`` is a store written by ``prepare_inputs``."""
+    if path is None or not str(path).endswith(".zarr") or not os.path.isdir(path):
+        return False
+    try:
+        with xr.open_zarr(path, consolidated=True) as ds:
+            return ds.attrs.get(LAYOUT_ATTR) == LAYOUT_VERSION
+    except (KeyError, OSError, ValueError):
+        return False
+
+
+def _chunks(ds, runid_chunk):
+    """One chunk per pulse year and gas and ``runid_chunk`` RFF-SP draws, with every
+    other dimension whole.
+    """
+    sizes = {"pulse_year": 1, "gas": 1, "runid": runid_chunk}
+    return {dim: sizes.get(dim, -1) for dim in ds.dims}
+
+
+def write_store(ds, path, runid_chunk=DEFAULT_RUNID_CHUNK):
+    """Write ``ds`` to the Zarr store ``path`` in the prepared layout.
+
+    The store is written next to ``path`` and moved into place once complete, so an
+    interrupted write leaves no partial store behind.
+    """
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+
+    ds = ds.chunk(_chunks(ds, runid_chunk))
+    for var in ds.variables.values():
+        var.encoding = {}
+    ds.attrs[LAYOUT_ATTR] = LAYOUT_VERSION
+    ds.to_zarr(tmp, mode="w", consolidated=True)
+
+    if path.exists():
+        shutil.rmtree(path)
+    os.replace(tmp, path)
+    return path
+
+
+def _open(path):
+    if str(path).endswith(".zarr"):
+        return xr.open_zarr(path)
+    return xr.open_dataset(path, chunks={})
+
+
+def prepare_inputs(conf, dest, runid_chunk=DEFAULT_RUNID_CHUNK):
+    """Copy the climate and socioeconomic inputs of ``conf`` into prepared stores.
+
+    Parameters
+    ----------
+    conf : dict
+        Config as generated by ``directory_setup.py``.
+    dest : str or :class:`pathlib.Path`
+        Directory to write the stores to, in ``climate`` and ``econ`` subdirectories.
+    runid_chunk : int, optional
+        Number of RFF-SP draws per chunk.
+
+    Returns
+    -------
+    dict
+        A copy of ``conf`` pointing at the prepared stores.
+    """
+    dest = Path(dest)
+    conf = {**conf, "rff_climate": dict(conf["rff_climate"]), "rffdata": dict(conf["rffdata"])}
+
+    climate_dir = dest / "climate"
+    climate_dir.mkdir(parents=True, exist_ok=True)
+    for key in CLIMATE_KEYS:
+        source = conf["rff_climate"].get(key)
+        if source is None or is_prepared(source):
+            continue
+        print(f"Preparing {source}...")
+        with _open(source) as ds:
+            path = write_store(ds, climate_dir / (Path(source).stem + ".zarr"), runid_chunk)
+        conf["rff_climate"][key] = str(path)
+
+    econ_dir = dest / "econ"
+    econ_dir.mkdir(parents=True, exist_ok=True)
+    for source in sorted(Path(conf["rffdata"]["socioec_output"]).glob("rff_*_socioeconomics.nc4")):
+        print(f"Preparing {source}...")
+        with _open(source) as ds:
+            write_store(ds, econ_dir / (source.stem + ".zarr"), runid_chunk)
+    conf["rffdata"]["socioec_output"] = str(econ_dir)
+    return conf
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rewrite climate and socioeconomic inputs into chunked Zarr stores.")
+    parser.add_argument("conf", nargs="?", default="generated_conf.yml", help="config to prepare inputs of, updated in place")
+    parser.add_argument("--dest", default=None, help="directory to write the stores to (default: input/prepared next to the config)")
+    parser.add_argument("--runid-chunk", type=int, default=DEFAULT_RUNID_CHUNK, help="number of RFF-SP draws per chunk")
+    args = parser.parse_args()
+
+    with open(args.conf, "r") as stream:
+        conf = yaml.safe_load(stream)
+    dest = args.dest or Path(args.conf).absolute().parent / "input" / "prepared"
+    conf = prepare_inputs(conf, dest, runid_chunk=args.runid_chunk)
+    with open(args.conf, "w") as outfile:
+        yaml.dump(conf, outfile, default_flow_style=False)
+    print(f"Prepared inputs written to {dest}")
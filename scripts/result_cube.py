@@ -0,0 +1,69 @@
+"""Preallocated assembly of per-run SCGHG results.
+
+``ResultCube`` knows the discount rates, menu options and sectors of a sweep up front.
+The output arrays are allocated once, on the first insert, and every run writes its
+result into its own slice, instead of expanding each result and merging all of them
+with ``xr.combine_by_coords``.
+"""
+import numpy as np
+import xarray as xr
+
+
+class ResultCube:
+    """Output arrays of ``(*run dims, *result dims)`` filled in one run at a time.
+
+    Parameters
+    ----------
+    **run_coords : sequence
+        Labels of each run dimension, e.g. ``discount_rate=[...], sector=[...]``. As with
+        ``xr.combine_by_coords``, labels are sorted.
+    """
+
+    def __init__(self, **run_coords):
+        self.run_coords = {k: sorted(set(v)) for k, v in run_coords.items()}
+        self.run_dims = list(self.run_coords)
+        self.template = None
+        self.arrays = None
+        self.name = None
+
+    def insert(self, result, **labels):
+        """Write ``result`` (a Dataset or DataArray) into the slice at ``labels``."""
+        if isinstance(result, xr.DataArray):
+            self.name = result.name
+            result = result.to_dataset(name=result.name)
+        if self.template is None:
+            self._allocate(result)
+
+        index = tuple(self.run_coords[d].index(labels[d]) for d in self.run_dims)
+        for name, var in result.data_vars.items():
+            template = self.template[name]
+            # Align to the first result's coordinates if a run's labels are ordered
+            # differently
+            if any(
+                not var.indexes[d].equals(template.indexes[d])
+                for d in template.dims
+                if d in template.indexes
+            ):
+                var = var.reindex({d: template.indexes[d] for d in template.indexes})
+            self.arrays[name][index] = var.transpose(*template.dims).values
+
+    def _allocate(self, result):
+        self.template = result
+        shape = tuple(len(self.run_coords[d]) for d in self.run_dims)
+        # Slices of runs not inserted are missing, or zero for integer variables such as counts
+        self.arrays = {
+            name: np.full(shape + var.shape, np.nan if var.dtype.kind in "fc" else 0, dtype=var.dtype)
+            for name, var in result.data_vars.items()
+        }
+
+    def to_xarray(self):
+        """The assembled outputs, as a DataArray if DataArrays were inserted."""
+        # Dims are ordered as by ``expand_dims`` and ``xr.combine_by_coords``: run dims
+        # lead each variable, while the dims of the Dataset, and so the columns of its
+        # dataframes, follow the coordinates of the results and then the run dims
+        ds = xr.Dataset(coords={**self.template.coords, **self.run_coords})
+        for name, var in self.template.data_vars.items():
+            ds[name] = (self.run_dims + list(var.dims), self.arrays[name], var.attrs)
+        if self.name is not None:
+            return ds[self.name]
+        return ds
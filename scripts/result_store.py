@@ -0,0 +1,134 @@
+"""Content-addressed store of per-run SCGHG results.
+
+Each ``epa_scghg`` result ``[adjustments, gcnp, meta]`` is saved under a key that hashes
+the run parameters, the config contents and fingerprints of the input files it reads.
+Results of runs of both domains, ``{domain: [adjustments, gcnp, meta]}``, are saved with
+one subdirectory per domain. Runs that do not return gcnp (``None``) save no gcnp.
+Rerunning a sweep loads results whose key is already in the store and recomputes only
+the runs whose parameters or inputs changed.
+"""
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+import xarray as xr
+
+# Bump when the layout or meaning of stored results changes
+STORE_VERSION = 1
+
+
+def fingerprint(path):
+    """Cheap fingerprint of a file or directory (e.g. a zarr store) from the size and
+    modification time of the files it contains.
+    """
+    path = Path(path)
+    if path.is_file():
+        stat = path.stat()
+        return [str(path), stat.st_size, stat.st_mtime_ns]
+    elif path.is_dir():
+        files = []
+        for root, _, names in os.walk(path):
+            for name in sorted(names):
+                stat = (Path(root) / name).stat()
+                files.append(
+                    [os.path.relpath(Path(root) / name, path), stat.st_size, stat.st_mtime_ns]
+                )
+        return [str(path), sorted(files)]
+    return [str(path), None]
+
+
+def run_key(run, conf, input_paths, **extra):
+    """Hash the parameters of a run, its config and its input fingerprints into a key.
+
+    Parameters
+    ----------
+    run : dict
+        Keyword arguments of the ``epa_scghg`` call.
+    conf : dict
+        Config contents. Only settings that affect results should be included.
+    input_paths : list of str or :class:`pathlib.Path`
+        Files and directories read by the run.
+    **extra
+        Anything else the results depend on, e.g. package versions.
+    """
+    content = {
+        "store_version": STORE_VERSION,
+        "run": run,
+        "conf": conf,
+        "inputs": [fingerprint(p) for p in sorted(map(str, input_paths))],
+        **extra,
+    }
+    blob = json.dumps(content, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+def _load_result(run_dir):
+    adjustments = xr.load_dataset(run_dir / "adjustments.nc4")
+    gcnp = xr.load_dataarray(run_dir / "gcnp.nc4") if (run_dir / "gcnp.nc4").exists() else None
+    with open(run_dir / "meta.json", "r") as f:
+        meta = json.load(f)
+    return [adjustments, gcnp, meta]
+
+
+def _save_result(run_dir, result):
+    adjustments, gcnp, meta = result
+    adjustments.to_netcdf(run_dir / "adjustments.nc4")
+    if gcnp is not None:
+        gcnp.to_netcdf(run_dir / "gcnp.nc4")
+    with open(run_dir / "meta.json", "w") as f:
+        json.dump(meta, f)
+
+
+class ResultStore:
+    """Directory of saved ``epa_scghg`` results, one subdirectory per key."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def __contains__(self, key):
+        return (self.path / key / "meta.json").exists() or (self.path / key / "domains.json").exists()
+
+    def load(self, key):
+        run_dir = self.path / key
+        if (run_dir / "domains.json").exists():
+            with open(run_dir / "domains.json", "r") as f:
+                domains = json.load(f)
+            return {domain: _load_result(run_dir / domain) for domain in domains}
+        return _load_result(run_dir)
+
+    def save(self, key, result):
+        # Write to a temporary directory first so that an interrupted write never
+        # leaves a partial result behind under a valid key
+        tmp_dir = self.path / f".tmp-{key}-{uuid.uuid4().hex}"
+        tmp_dir.mkdir()
+        if isinstance(result, dict):
+            for domain, domain_result in result.items():
+                (tmp_dir / domain).mkdir()
+                _save_result(tmp_dir / domain, domain_result)
+            with open(tmp_dir / "domains.json", "w") as f:
+                json.dump(list(result), f)
+        else:
+            _save_result(tmp_dir, result)
+
+        run_dir = self.path / key
+        if run_dir.exists():
+            shutil.rmtree(run_dir)
+        os.rename(tmp_dir, run_dir)
+
+    def map(self, executor, fn, runs, keys):
+        """Like ``executor.map(fn, runs)``, but loads runs whose key is already stored
+        and saves the others as their results arrive. Results are yielded in order.
+        """
+        done = [key in self for key in keys]
+        computed = executor.map(fn, [run for run, d in zip(runs, done) if not d])
+        for key, d in zip(keys, done):
+            if d:
+                yield self.load(key)
+            else:
+                result = next(computed)
+                self.save(key, result)
+                yield result
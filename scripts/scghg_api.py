@@ -0,0 +1,220 @@
+"""Library entry point and long-running HTTP service for SCGHG runs.
+
+``command_line_scghg.py`` imports dscim and reads its config as soon as it is imported,
+and its command line interface prompts for the runs to compute. This module imports
+nothing beyond the standard library until it is first used, so that other programs can
+import it cheaply and compute single SCGHGs without prompts::
+
+    import scghg_api
+    scghg_api.load("generated_conf.yml")
+    scghg_api.scghg("CAMEL_m1_c0.20", discount_rate="2.0% Ramsey", pulse_year=2030)
+
+Inputs are kept in memory by the input cache of the process, so only the first query of
+a pulse year, domain and discount rate reads them. ``serve`` keeps a process running
+and answers the same queries over HTTP on a local port::
+
+    python scripts/scghg_api.py generated_conf.yml --port 8765 --warm
+    curl 'http://127.0.0.1:8765/scghg?sector=CAMEL_m1_c0.20&discount_rate=2.0%25%20Ramsey&pulse_year=2030'
+"""
+import argparse
+import json
+import os
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+# Read by command_line_scghg on import to find the config
+CONF_ENV = "DSCIM_EPA_CONF"
+
+DOMAINS = ("global", "territorial_us")
+
+_scghg = None
+
+
+def load(conf="generated_conf.yml"):
+    """Import the SCGHG code with the config ``conf``, relative to the working directory.
+
+    Later calls with another config switch to it. Returns the ``command_line_scghg``
+    module.
+    """
+    global _scghg
+    os.environ[CONF_ENV] = str(conf)
+    if _scghg is None:
+        import command_line_scghg
+
+        _scghg = command_line_scghg
+    elif _scghg.conf_name != str(conf):
+        _scghg.load_config(str(conf))
+    return _scghg
+
+
+def _module():
+    return _scghg if _scghg is not None else load(os.environ.get(CONF_ENV, "generated_conf.yml"))
+
+
+def _run(sector, eta=None, rho=None, pulse_year=2020, domain="global", discount_rate=None,
+         discount_type="euler_ramsey", menu_option="risk_aversion"):
+    """Arguments of ``epa_scghg`` for a query, checked against the config."""
+    scghg = _module()
+    if domain not in DOMAINS:
+        raise ValueError(f"Unknown domain '{domain}'. Choose one of {DOMAINS}.")
+    if sector not in scghg.conf["sectors"]:
+        raise ValueError(f"Unknown sector '{sector}'. Choose one of {list(scghg.conf['sectors'])}.")
+    if discount_rate is not None:
+        rates = {label: key for key, label in scghg.discount_conversion_dict.items()}
+        if discount_rate not in rates:
+            raise ValueError(f"Unknown discount rate '{discount_rate}'. Choose one of {list(rates)}.")
+        eta, rho = (float(v) for v in rates[discount_rate].split("_"))
+    elif eta is None or rho is None:
+        raise ValueError("Either discount_rate or both eta and rho are required")
+
+    terr_us = domain == "territorial_us"
+    return dict(sector=sector + "_USA" if terr_us else sector,
+                terr_us=terr_us,
+                eta=float(eta),
+                rho=float(rho),
+                pulse_year=int(pulse_year),
+                discount_type=discount_type,
+                menu_option=menu_option)
+
+
+def scghg(sector, eta=None, rho=None, pulse_year=2020, domain="global", discount_rate=None,
+          discount_type="euler_ramsey", menu_option="risk_aversion", tolerance=None,
+          seed=0):
+    """Certainty equivalent SCGHGs of one sector, discount rate, pulse year and domain.
+
+    Parameters
+    ----------
+    sector : str
+        Sector as named in the config, e.g. ``"CAMEL_m1_c0.20"``.
+    eta, rho : float, optional
+        Discount rate parameters. Alternatively, give ``discount_rate``.
+    pulse_year : int, optional
+    domain : str, optional
+        ``"global"`` or ``"territorial_us"``.
+    discount_rate : str, optional
+        Discount rate label, e.g. ``"2.0% Ramsey"``, in place of ``eta`` and ``rho``.
+    discount_type, menu_option : str, optional
+    tolerance : float, optional
+        If given, RFF-SP draws are added in random batches only until the 95% confidence
+        interval of every SCGHG is within this fraction of it.
+    seed : int, optional
+        Seed of the order of draws when ``tolerance`` is given.
+
+    Returns
+    -------
+    dict
+        SCGHG of each gas, in 2020 dollars per tonne.
+    """
+    scghg_module = _module()
+    run = _run(sector, eta, rho, pulse_year, domain, discount_rate, discount_type, menu_option)
+    if tolerance is not None:
+        run.update(tolerance=float(tolerance), seed=int(seed))
+    adjustments, _, _ = scghg_module.epa_scghg(**run, return_gcnp=False)
+    collapsed = scghg_module.collapse_scghgs(adjustments)
+    return {scghg_module.gas_conversion_dict.get(gas, gas): float(collapsed.sel(gas=gas))
+            for gas in collapsed.gas.values}
+
+
+def warm(sectors=None, pulse_years=None, domains=("global",), etas_rhos=None):
+    """Load the inputs of the given queries into the input cache ahead of the queries.
+
+    Defaults to every sector and pulse year in the config and every discount rate.
+    """
+    scghg_module = _module()
+    conf = scghg_module.conf
+    cache = scghg_module.get_input_cache()
+    sectors = sectors or list(conf["sectors"])
+    pulse_years = pulse_years or conf["rffdata"]["pulse_years"]
+    etas_rhos = etas_rhos or [[float(v) for v in key.split("_")] for key in scghg_module.discount_conversion_dict]
+
+    for pulse_year in pulse_years:
+        climate = cache.climate(pulse_year, **conf["rff_climate"])
+        climate.anomalies
+        climate.conversion
+    cache.population(scghg_module.socioeconomics_path(conf, "global"))
+    for domain in domains:
+        terr_us = domain == "territorial_us"
+        cache.econ_vars(scghg_module.socioeconomics_path(conf, "USA" if terr_us else "global")).econ_vars
+        for sector in sectors:
+            run = dict(sector=sector + "_USA" if terr_us else sector, terr_us=terr_us,
+                       etas_rhos=etas_rhos, menu_option="risk_aversion", discount_type="euler_ramsey")
+            for path in scghg_module.run_input_paths(conf, run):
+                if str(path).endswith("_dfc.nc4"):
+                    cache.dataset(str(path))
+
+
+class SCGHGRequestHandler(BaseHTTPRequestHandler):
+    """Answers ``GET /scghg?<query>`` and ``POST /scghg`` with a JSON query, whose
+    fields are the arguments of ``scghg``, and ``GET /health``.
+
+    Requests are handled one at a time, since runs share the input cache.
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            self._reply(200, {"status": "ok", "conf": _module().conf_name})
+        elif url.path == "/scghg":
+            self._query(dict(parse_qsl(url.query)))
+        else:
+            self._reply(404, {"error": f"Unknown path '{url.path}'"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/scghg":
+            self._reply(404, {"error": f"Unknown path '{url.path}'"})
+            return
+        try:
+            query = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or "{}")
+        except json.JSONDecodeError as e:
+            self._reply(400, {"error": f"Invalid JSON: {e}"})
+            return
+        self._query(query)
+
+    def _query(self, query):
+        start = time.perf_counter()
+        try:
+            result = scghg(**query)
+        except (TypeError, ValueError) as e:
+            self._reply(400, {"error": str(e)})
+            return
+        except Exception as e:
+            self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self._reply(200, dict(query, scghg=result, seconds=time.perf_counter() - start))
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve(conf="generated_conf.yml", host="127.0.0.1", port=8765, warm_inputs=False):
+    """Answer SCGHG queries over HTTP until interrupted."""
+    load(conf)
+    if warm_inputs:
+        print("Loading inputs...")
+        warm()
+    server = HTTPServer((host, port), SCGHGRequestHandler)
+    print(f"Serving SCGHGs at http://{host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve SCGHG queries over HTTP with inputs kept in memory.")
+    parser.add_argument("conf", nargs="?", default="generated_conf.yml", help="config, relative to the working directory")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: local connections only)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--warm", action="store_true", help="load the inputs of every sector, discount rate and pulse year before serving")
+    args = parser.parse_args()
+
+    serve(args.conf, host=args.host, port=args.port, warm_inputs=args.warm)
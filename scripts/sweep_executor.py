@@ -0,0 +1,142 @@
+"""Executors that run the independent ``epa_scghg`` calls of an ``epa_scghgs`` sweep.
+
+Every executor yields results in the order the runs were submitted, regardless of the
+order in which they finish, so the merged outputs and attributes of a sweep do not
+depend on how the runs were scheduled. Stage timings recorded by runs in worker
+processes are added to the recorder of this process.
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from instrumentation import collect, get_recorder
+
+BACKENDS = ("serial", "processes", "dask")
+
+
+class SerialExecutor:
+    """Run each SCGHG run in the current process, one after another."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def map(self, fn, runs):
+        """Lazily call ``fn(**run)`` for each of ``runs``, yielding results in order."""
+        for run in runs:
+            yield fn(**run)
+
+    def close(self):
+        pass
+
+
+class ProcessExecutor(SerialExecutor):
+    """Run SCGHG runs in a pool of local worker processes.
+
+    Parameters
+    ----------
+    max_workers : int or None, optional
+        Number of worker processes. Defaults to the number of CPUs.
+    initializer, initargs : optional
+        Called in each worker process on startup, e.g. to configure its input cache.
+    """
+
+    def __init__(self, max_workers=None, initializer=None, initargs=()):
+        # Workers are spawned rather than forked, since forking a process whose dask
+        # or netCDF threads hold locks can leave the workers deadlocked
+        self.pool = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=initializer,
+            initargs=initargs,
+        )
+
+    def map(self, fn, runs):
+        # Submit everything up front so all workers are busy, then hand back results
+        # in submission order.
+        futures = [self.pool.submit(collect, fn, **run) for run in runs]
+        for future in futures:
+            result, records = future.result()
+            get_recorder().records.extend(records)
+            yield result
+
+    def close(self):
+        self.pool.shutdown()
+
+
+class DaskExecutor(SerialExecutor):
+    """Run SCGHG runs on a ``dask.distributed`` cluster.
+
+    Parameters
+    ----------
+    address : str or None, optional
+        Address of a running scheduler. If None, a ``LocalCluster`` is started.
+    max_workers : int or None, optional
+        Number of workers of the ``LocalCluster``. Ignored if ``address`` is set.
+    initializer, initargs : optional
+        Called once on every worker, e.g. to configure its input cache.
+    """
+
+    def __init__(self, address=None, max_workers=None, initializer=None, initargs=()):
+        try:
+            from dask.distributed import Client, LocalCluster
+        except ImportError:
+            raise ImportError(
+                "The 'dask' executor requires dask.distributed. Please install it or "
+                "choose the 'serial' or 'processes' executor."
+            )
+
+        if address is None:
+            self.cluster = LocalCluster(n_workers=max_workers, threads_per_worker=1)
+            self.client = Client(self.cluster)
+        else:
+            self.cluster = None
+            self.client = Client(address)
+
+        # Workers need the helper modules that the run functions import
+        for module in ["prepare_inputs.py", "input_cache.py", "instrumentation.py"]:
+            self.client.upload_file(str(Path(__file__).parent / module))
+
+        if initializer is not None:
+            self.client.run(initializer, *initargs)
+
+    def map(self, fn, runs):
+        futures = [self.client.submit(collect, fn, pure=False, **run) for run in runs]
+        for future in futures:
+            result, records = future.result()
+            get_recorder().records.extend(records)
+            yield result
+            future.release()
+
+    def close(self):
+        self.client.close()
+        if self.cluster is not None:
+            self.cluster.close()
+
+
+def worker_count(backend="serial", max_workers=None, address=None):
+    """Number of processes that run SCGHG runs, each with its own input cache, under
+    ``backend``. For a running dask scheduler, the number of its workers.
+    """
+    if backend == "serial":
+        return 1
+    if backend == "dask" and address is not None:
+        from dask.distributed import Client
+
+        with Client(address) as client:
+            return max(len(client.scheduler_info()["workers"]), 1)
+    return max_workers or os.cpu_count() or 1
+
+
+def get_executor(backend="serial", max_workers=None, address=None, **kwargs):
+    """Create the executor for ``backend``, one of ``BACKENDS``."""
+    if backend == "serial":
+        return SerialExecutor()
+    elif backend == "processes":
+        return ProcessExecutor(max_workers=max_workers, **kwargs)
+    elif backend == "dask":
+        return DaskExecutor(address=address, max_workers=max_workers, **kwargs)
+    raise ValueError(f"Unknown executor '{backend}'. Choose one of {BACKENDS}.")
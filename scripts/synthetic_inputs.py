@@ -0,0 +1,248 @@
+"""Synthetic SCGHG inputs for offline benchmarking.
+
+Writes FaIR GMST and GMSL trajectories, pulse conversion factors, RFF socioeconomics and
+damage function coefficients with the variables, dimensions and file layout of the
+inputs downloaded by ``directory_setup.py``, plus a ``generated_conf.yml`` pointing at
+them. Values are smooth, plausibly scaled random draws, so runs exercise the same code
+paths and array sizes as production runs, but the SCGHGs they produce are meaningless.
+
+Usage::
+
+    python scripts/synthetic_inputs.py <directory> --runids 1000
+"""
+import argparse
+import re
+from pathlib import Path
+
+import numpy as np
+import xarray as xr
+import yaml
+
+from directory_setup import make_conf, makedir
+
+GASES = ["CO2_Fossil", "CH4", "N2O"]
+PULSE_YEARS = [2020, 2030, 2040, 2050, 2060, 2070, 2080]
+ETAS_RHOS = [
+    [1.016010255, 9.149608e-05],
+    [1.244459066, 0.00197263997],
+    [1.421158116, 0.00461878399],
+]
+DISCOUNT_TYPES = [["risk_aversion", "euler_ramsey"]]
+
+# Pulse size (tonnes), peak GMST response (K) and decay time (years) of each gas
+PULSES = {
+    "CO2_Fossil": (1e9, 5e-4, np.inf),
+    "CH4": (1e6, 4e-4, 12.0),
+    "N2O": (1e6, 3e-4, 110.0),
+}
+
+# Global and U.S. (region, 2020 population, 2020 GDP per capita)
+REGIONS = {"global": ("world", 7.8e9, 1.6e4), "USA": ("USA", 3.3e8, 6.5e4)}
+
+
+def climate_inputs(runids, years, gases, pulse_years, rng):
+    """FaIR GMST and GMSL trajectories for every gas, pulse year and RFF-SP draw.
+
+    Returns the datasets written to ``gmst_pulse.nc`` and ``gmsl_pulse.zarr``.
+    """
+    years = np.asarray(years)
+    # Climate sensitivity of each draw scales its warming and its response to a pulse
+    sensitivity = rng.lognormal(0, 0.25, len(runids))[:, None]
+    warming = 2.5 * (1 - np.exp(-(years - years[0]) / 120))
+
+    def trajectories(scale):
+        # (gas, pulse_year, ..., year) control and pulse GMST, and the implied GMSL in cm
+        control_gmst = 0.9 + scale * warming
+        control_gmst = control_gmst + (
+            0.05 * rng.standard_normal(control_gmst.shape) if np.ndim(scale) else 0
+        )
+        pulse_gmst = np.empty((len(gases), len(pulse_years)) + control_gmst.shape)
+        for i, gas in enumerate(gases):
+            _, peak, decay = PULSES.get(gas, PULSES["CH4"])
+            for j, pulse_year in enumerate(pulse_years):
+                t = np.maximum(years - pulse_year, 0)
+                response = (years >= pulse_year) * (1 - np.exp(-t / 4)) * np.exp(-t / decay)
+                pulse_gmst[i, j] = control_gmst + scale * peak * response
+        control_gmst = np.broadcast_to(control_gmst, pulse_gmst.shape)
+        # Sea level rises in proportion to cumulative warming, from 15 cm in the first year
+        control_gmsl = 15 + 0.3 * np.cumsum(control_gmst, axis=-1)
+        pulse_gmsl = 15 + 0.3 * np.cumsum(pulse_gmst, axis=-1)
+        return control_gmst, pulse_gmst, control_gmsl, pulse_gmsl
+
+    coords = {"gas": gases, "pulse_year": pulse_years, "runid": runids, "year": years}
+    dims = list(coords)
+    median_dims = ["gas", "pulse_year", "year"]
+
+    control_gmst, pulse_gmst, control_gmsl, pulse_gmsl = trajectories(sensitivity)
+    (median_control_gmst, median_pulse_gmst, median_control_gmsl, median_pulse_gmsl) = trajectories(1.0)
+
+    gmst = xr.Dataset(
+        {
+            "control_temperature": (dims, control_gmst),
+            "pulse_temperature": (dims, pulse_gmst),
+            "medianparams_control_temperature": (median_dims, median_control_gmst),
+            "medianparams_pulse_temperature": (median_dims, median_pulse_gmst),
+        },
+        coords=coords,
+    )
+    gmsl = xr.Dataset(
+        {
+            "gmsl": (["runtype"] + dims, np.stack([control_gmsl, pulse_gmsl])),
+            "gmsl_median": (["runtype"] + median_dims, np.stack([median_control_gmsl, median_pulse_gmsl])),
+        },
+        coords={"runtype": ["control", "pulse"], **coords},
+    )
+    return gmst, gmsl
+
+
+def conversion_input(gases):
+    """Factors converting the damages of a pulse to damages per tonne of each gas."""
+    return xr.Dataset(
+        {"emissions": ("gas", [1 / PULSES.get(gas, PULSES["CH4"])[0] for gas in gases])},
+        coords={"gas": gases},
+    )
+
+
+def econ_input(runids, years, domain, rng):
+    """RFF GDP and population of the world (``domain="global"``) or the U.S."""
+    region, pop_2020, gdppc_2020 = REGIONS[domain]
+    years = np.asarray(years)
+    t = (years - 2020)[None, :]
+    growth = rng.normal(0.015, 0.005, len(runids))[:, None]
+    peak_pop = rng.normal(1.3, 0.1, len(runids))[:, None]
+    pop = pop_2020 * (1 + (peak_pop - 1) * (1 - np.exp(-np.maximum(t, 0) / 60)))
+    gdp = pop * gdppc_2020 * np.exp(growth * t)
+    coords = {"runid": runids, "region": [region], "year": years}
+    return xr.Dataset(
+        {
+            "gdp": (["runid", "region", "year"], gdp[:, None, :]),
+            "pop": (["runid", "region", "year"], pop[:, None, :]),
+        },
+        coords=coords,
+    )
+
+
+def damage_function_coefficients(formula, econ, rng):
+    """Coefficients of every term of ``formula`` for each RFF-SP draw and year.
+
+    Damages are about 0.2% of GDP at 2 K of warming or 50 cm of sea level rise.
+    """
+    gdp = econ.gdp.sum("region")
+    scale = xr.DataArray(rng.lognormal(0, 0.2, econ.runid.size), coords={"runid": econ.runid})
+    share = {
+        "anomaly": 4e-4,
+        "np.power(anomaly, 2)": 3e-4,
+        "gmsl": 2e-5,
+        "np.power(gmsl, 2)": 4e-7,
+    }
+    terms = re.split(r"\s*\+\s*", formula.split("~")[1].strip())
+    return xr.Dataset(
+        {term: (gdp * share[term] * scale).transpose("runid", "year") for term in terms if term != "-1"}
+    )
+
+
+def generate_inputs(
+    root,
+    n_runids=10000,
+    start_year=2000,
+    end_year=2300,
+    gases=GASES,
+    sectors=None,
+    pulse_years=PULSE_YEARS,
+    etas_rhos=ETAS_RHOS,
+    discount_types=DISCOUNT_TYPES,
+    seed=0,
+):
+    """Write synthetic inputs and their config under ``root``.
+
+    Parameters
+    ----------
+    root : str or :class:`pathlib.Path`
+        Directory to write ``input/``, ``output/`` and ``generated_conf.yml`` to, laid
+        out as by ``directory_setup.py``.
+    n_runids : int, optional
+        Number of RFF-SP draws. Production inputs have 10,000.
+    start_year, end_year : int, optional
+        Years of the climate trajectories. The start year must be no later than 2001,
+        the start of the period anomalies are rebased to. Socioeconomics and damage
+        functions start in 2010.
+    gases, pulse_years : list, optional
+    sectors : list of str or None, optional
+        Sectors to write damage function coefficients for, as named in the config.
+        Defaults to every sector in the config. Coefficients are written for both
+        global and territorial U.S. runs.
+    etas_rhos, discount_types : list, optional
+        [eta, rho] pairs and [menu option, discount type] pairs to write coefficients for.
+    seed : int, optional
+
+    Returns
+    -------
+    :class:`pathlib.Path`
+        Path of the generated config.
+    """
+    root = Path(root).absolute()
+    conf = make_conf(root / "input", root / "output")
+    conf["rff_climate"]["gases"] = list(gases)
+    conf["rffdata"]["pulse_years"] = list(pulse_years)
+    if sectors is not None:
+        conf["sectors"] = {k: v for k, v in conf["sectors"].items() if k in sectors}
+
+    rng = np.random.default_rng(seed)
+    runids = np.arange(1, n_runids + 1)
+    econ_years = np.arange(2010, end_year + 1)
+
+    climate_dir = Path(conf["rff_climate"]["gmst_fair_path"]).parent
+    makedir(climate_dir)
+    gmst, gmsl = climate_inputs(runids, np.arange(start_year, end_year + 1), list(gases), list(pulse_years), rng)
+    gmst.to_netcdf(conf["rff_climate"]["gmst_fair_path"])
+    gmsl.to_zarr(conf["rff_climate"]["gmsl_fair_path"], mode="w", consolidated=True)
+    del gmst, gmsl
+    conversion_input(list(gases)).to_netcdf(conf["rff_climate"]["damages_pulse_conversion_path"])
+
+    makedir(conf["rffdata"]["socioec_output"])
+    econ = {}
+    for domain in REGIONS:
+        econ[domain] = econ_input(runids, econ_years, domain, rng)
+        econ[domain].to_netcdf(f"{conf['rffdata']['socioec_output']}/rff_{domain}_socioeconomics.nc4")
+
+    library = Path(conf["paths"]["rff_damage_function_library"])
+    for sector, sector_conf in conf["sectors"].items():
+        for sector_dir, domain in [(sector, "global"), (sector + "_USA", "USA")]:
+            makedir(library / sector_dir)
+            for (menu_option, discount_type), (eta, rho) in [
+                (d, er) for d in discount_types for er in etas_rhos
+            ]:
+                coefficients = damage_function_coefficients(sector_conf["formula"], econ[domain], rng)
+                coefficients.to_netcdf(
+                    library / sector_dir / f"{menu_option}_{discount_type}_eta{round(eta,3)}_rho{round(rho,3)}_dfc.nc4"
+                )
+
+    conf_path = root / "generated_conf.yml"
+    with open(conf_path, "w") as outfile:
+        yaml.dump(conf, outfile, default_flow_style=False)
+    return conf_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic SCGHG inputs for benchmarking.")
+    parser.add_argument("root", help="directory to write inputs and generated_conf.yml to")
+    parser.add_argument("--runids", type=int, default=10000, help="number of RFF-SP draws")
+    parser.add_argument("--start-year", type=int, default=2000)
+    parser.add_argument("--end-year", type=int, default=2300)
+    parser.add_argument("--gases", nargs="+", default=GASES)
+    parser.add_argument("--sectors", nargs="+", default=None, help="defaults to every sector")
+    parser.add_argument("--pulse-years", nargs="+", type=int, default=PULSE_YEARS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    conf_path = generate_inputs(
+        args.root,
+        n_runids=args.runids,
+        start_year=args.start_year,
+        end_year=args.end_year,
+        gases=args.gases,
+        sectors=args.sectors,
+        pulse_years=args.pulse_years,
+        seed=args.seed,
+    )
+    print(f"Synthetic inputs and config written to {conf_path.parent}")